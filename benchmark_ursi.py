@@ -0,0 +1,287 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from ursi_core import (ENGINES, MIN_OBSERVED_SHARE, NEW_HIGH_WINDOW, OHLCV_FILE, STOCK_MA_PERIOD, _add_ursi,
+                       compact_ohlcv, compute_breadth, compute_breadth_metrics, load_ohlcv, parse_days)
+from ursi_export import build_sheets, export_sheets
+from ursi_html import embed_data, plotly_script_tag
+from ursi_indicators import INDICATORS, compute_indicators
+
+# Pipeline stages timed by bench_stages(), in order
+STAGES = ('load', 'parse', 'sort', 'shift', 'classify', 'aggregate', 'ma', 'excel', 'html')
+
+
+def make_universe(n_stocks, n_years, seed=0):
+    """Synthetic long-format frame shaped like df_ohlcv_195stocks.pkl (`stock`, `day`, `close`)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2025-06-30', periods=int(252 * n_years))
+
+    # Random-walk closes rounded to the tick, so some days are unchanged
+    returns = rng.normal(0, 0.02, size=(len(dates), n_stocks))
+    closes = np.round(10 * np.exp(np.cumsum(returns, axis=0)), 1)
+
+    # Staggered listings and ~2% missing sessions per stock
+    listed = np.arange(len(dates))[:, None] >= rng.integers(0, len(dates) // 4, size=n_stocks)
+    present = listed & (rng.random(closes.shape) > 0.02)
+
+    date_idx, stock_idx = np.nonzero(present)
+    days = dates.strftime('%Y_%m_%d').to_numpy()
+    stocks = np.array([f'S{i:04d}' for i in range(n_stocks)])
+    return pd.DataFrame({
+        'stock': stocks[stock_idx],
+        'day': days[date_idx],
+        'close': closes[date_idx, stock_idx],
+    })
+
+
+def legacy_breadth(df):
+    """The original script pipeline (int64 flag columns on the full frame), kept as a baseline."""
+    df = df.sort_values(['stock', 'date'])
+    df['prev_close'] = df.groupby('stock')['close'].shift(1)
+    df['is_advancing'] = (df['close'] > df['prev_close']).astype(int)
+    df['is_declining'] = (df['close'] < df['prev_close']).astype(int)
+    df['is_unchanged'] = (df['close'] == df['prev_close']).astype(int)
+    df_clean = df.dropna(subset=['prev_close'])
+    return df_clean.groupby('date').agg({
+        'is_advancing': 'sum',
+        'is_declining': 'sum',
+        'is_unchanged': 'sum'
+    }).reset_index()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: peak working set through psutil
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _memory_probe(mode, path):
+    """Run one breadth mode in a fresh process; returns (frame MB, peak RSS MB before, after)."""
+    df = pd.read_pickle(path)
+    if mode != 'legacy':
+        df = compact_ohlcv(df)
+    frame_mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+    before = peak_rss_mb()
+    if mode == 'legacy':
+        legacy_breadth(df)
+    else:
+        compute_breadth(df, engine=mode)
+    return frame_mb, before, peak_rss_mb()
+
+
+def memory_report(df, label):
+    """Peak RSS of the original pipeline against the compact-dtype engines."""
+    print(f"\nMemory, {label}:")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ohlcv.pkl')
+        df.to_pickle(path)
+        # Peak RSS never goes down, so each mode gets its own process
+        ctx = multiprocessing.get_context('spawn')
+        for mode in ('legacy',) + ENGINES:
+            with ctx.Pool(1) as pool:
+                frame_mb, before, after = pool.apply(_memory_probe, (mode, path))
+            print(f"  - {mode:<7} frame {frame_mb:8.1f} MB   peak RSS {before:8.1f} -> {after:8.1f} MB")
+
+
+def time_call(fn, repeat):
+    """Best wall time in seconds over `repeat` runs, and the last result."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _stage_load(state):
+    state['df'] = compact_ohlcv(pd.read_pickle(state['path']).drop(columns='date', errors='ignore'))
+
+
+def _stage_parse(state):
+    state['df']['date'] = parse_days(state['df']['day'])
+
+
+def _stage_sort(state):
+    state['df'] = state['df'][['stock', 'date', 'close']].sort_values(['stock', 'date'])
+
+
+def _stage_shift(state):
+    state['prev_close'] = state['df'].groupby('stock', observed=True)['close'].shift(1)
+
+
+def _stage_classify(state):
+    df, prev_close = state['df'], state['prev_close']
+    has_prev = prev_close.notna()
+    close, prev_close = df['close'][has_prev], prev_close[has_prev]
+    state['flags'] = pd.DataFrame({
+        'date': df['date'][has_prev],
+        'advancing_stocks': close > prev_close,
+        'declining_stocks': close < prev_close,
+        'unchanged_stocks': close == prev_close,
+    })
+
+
+def _stage_aggregate(state):
+    state['daily_stats'] = _add_ursi(state['flags'].groupby('date').sum().reset_index())
+
+
+def _stage_ma(state):
+    daily_stats = state['daily_stats']
+    state['daily_stats'] = daily_stats.join(compute_indicators(daily_stats, INDICATORS))
+
+
+def _stage_excel(state):
+    export_sheets(build_sheets(state['daily_stats']), os.path.join(state['tmp'], 'ursi_analysis.xlsx'))
+
+
+def _stage_html(state):
+    daily_stats = state['daily_stats']
+    output_file = os.path.join(state['tmp'], 'ursi_chart.html')
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=daily_stats['date'], y=daily_stats['URSI'], mode='lines', name='URSI',
+                             customdata=daily_stats[['advancing_stocks', 'declining_stocks', 'total_stocks']].values))
+    fig.add_trace(go.Scatter(x=daily_stats['date'], y=[None] * len(daily_stats), mode='lines', name='MA'))
+    page_data = embed_data(fig, daily_stats, ['advancing_stocks', 'declining_stocks', 'total_stocks'],
+                           'binary', 'lttb')
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(f"<html><head>{plotly_script_tag(output_file, 'cdn')}</head><body>"
+                f"<div id=\"plotDiv\"></div><script>{page_data}</script></body></html>")
+
+
+def run_stages(path, tmp, trace_memory=False):
+    """Run the pipeline once on the pickle at `path`; returns {stage: (seconds, MB)}.
+
+    With `trace_memory` the MB is the peak traced allocation during the stage
+    on top of what was allocated when it started (tracemalloc slows the run,
+    so timings come from untraced runs).
+    """
+    state = {'path': path, 'tmp': tmp}
+    results = {}
+    for name in STAGES:
+        stage = globals()[f'_stage_{name}']
+        if trace_memory:
+            tracemalloc.start()
+            start_mb = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        stage(state)
+        seconds = time.perf_counter() - start
+        peak_mb = float('nan')
+        if trace_memory:
+            peak_mb = (tracemalloc.get_traced_memory()[1] - start_mb) / 1024 ** 2
+            tracemalloc.stop()
+        results[name] = (seconds, peak_mb)
+    return results
+
+
+def bench_stages(df, label, repeat):
+    """Wall time (best of `repeat`) and peak allocation of every pipeline stage on `df`."""
+    print(f"\nStages, {label}: {df['stock'].nunique()} stocks, {df['day'].nunique()} days, {len(df):,} rows")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ohlcv.pkl')
+        df[['stock', 'day', 'close']].to_pickle(path)
+        best = {name: float('inf') for name in STAGES}
+        for _ in range(repeat):
+            for name, (seconds, _) in run_stages(path, tmp).items():
+                best[name] = min(best[name], seconds)
+        memory = run_stages(path, tmp, trace_memory=True)
+    for name in STAGES:
+        print(f"  - {name:<9} {best[name] * 1000:9.1f} ms   peak {memory[name][1]:8.1f} MB")
+    print(f"  - {'total':<9} {sum(best.values()) * 1000:9.1f} ms   process peak RSS {peak_rss_mb():8.1f} MB")
+
+
+def bench_engines(df, label, repeat):
+    """Time every breadth engine on `df` and check they agree."""
+    results = {}
+    print(f"\n{label}: {df['stock'].nunique()} stocks, {df['date'].nunique()} days, {len(df):,} rows")
+    for engine in ENGINES:
+        seconds, results[engine] = time_call(lambda: compute_breadth(df, engine=engine), repeat)
+        print(f"  - {engine:<7} {seconds * 1000:9.1f} ms")
+    for engine in ENGINES[1:]:
+        pd.testing.assert_frame_equal(results[ENGINES[0]], results[engine], check_dtype=False)
+    print(f"  - results identical across engines")
+
+
+def metrics_reference(df, high_low_window=NEW_HIGH_WINDOW, ma_period=STOCK_MA_PERIOD):
+    """new_highs, new_lows and pct_above_ma from per-stock pandas rolling windows, by date."""
+    dates = pd.DatetimeIndex(np.sort(df['date'].unique()))
+    counts = pd.DataFrame(0, index=dates, columns=['new_highs', 'new_lows', 'above_ma', 'has_ma'])
+    min_sessions = round(MIN_OBSERVED_SHARE * high_low_window)
+    for _, rows in df.groupby('stock', observed=True):
+        rows = rows.set_index('date')
+        close = rows['close'].reindex(dates).astype(float)
+        high = rows['high'].reindex(dates).astype(float) if 'high' in rows else close
+        low = rows['low'].reindex(dates).astype(float) if 'low' in rows else close
+        counts['new_highs'] += high > high.rolling(high_low_window, min_periods=min_sessions).max().shift(1)
+        counts['new_lows'] += low < low.rolling(high_low_window, min_periods=min_sessions).min().shift(1)
+        ma = close.rolling(ma_period, min_periods=round(MIN_OBSERVED_SHARE * ma_period)).mean()
+        counts['above_ma'] += close > ma
+        counts['has_ma'] += ma.notna() & close.notna()
+    counts['pct_above_ma'] = counts['above_ma'] / counts['has_ma'] * 100
+    return counts[['new_highs', 'new_lows', 'pct_above_ma']]
+
+
+def bench_metrics(df, label, repeat):
+    """Time compute_breadth_metrics on `df` and check it against metrics_reference()."""
+    print(f"\nMetrics, {label}: {df['stock'].nunique()} stocks, {df['date'].nunique()} days, {len(df):,} rows")
+    seconds, metrics = time_call(lambda: compute_breadth_metrics(df), repeat)
+    print(f"  - dense     {seconds * 1000:9.1f} ms")
+    reference = metrics_reference(df).reindex(metrics['date'])
+    for name in reference.columns:
+        np.testing.assert_allclose(metrics[name].to_numpy(dtype=float), reference[name].to_numpy(dtype=float))
+    print(f"  - matches per-stock pandas rolling windows")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark URSI breadth engines')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stocks', type=int, nargs='+', default=[195, 2000])
+    parser.add_argument('--years', type=float, nargs='+', default=[8.5])
+    parser.add_argument('--memory', action='store_true', help='report peak RSS per engine')
+    parser.add_argument('--stages', action='store_true',
+                        help='time every pipeline stage (load ... html) instead of the breadth engines')
+    parser.add_argument('--metrics', action='store_true',
+                        help='also time compute_breadth_metrics and check it against pandas rolling windows')
+    args = parser.parse_args()
+
+    # Real 195-stock universe when available
+    if os.path.exists(OHLCV_FILE):
+        df = load_ohlcv(OHLCV_FILE)
+        if args.stages:
+            bench_stages(df, 'df_ohlcv_195stocks.pkl', args.repeat)
+        else:
+            bench_engines(df, 'df_ohlcv_195stocks.pkl', args.repeat)
+        if args.metrics:
+            bench_metrics(compact_ohlcv(df), 'df_ohlcv_195stocks.pkl', args.repeat)
+        if args.memory:
+            memory_report(df, 'df_ohlcv_195stocks.pkl')
+
+    for n_stocks in args.stocks:
+        for n_years in args.years:
+            df = make_universe(n_stocks, n_years)
+            label = f'synthetic {n_stocks} stocks x {n_years} years'
+            if args.stages:
+                bench_stages(df, label, args.repeat)
+            else:
+                df['date'] = parse_days(df['day'])
+                bench_engines(df, 'Synthetic universe', args.repeat)
+            if args.metrics:
+                df['date'] = parse_days(df['day'])
+                bench_metrics(compact_ohlcv(df), label, args.repeat)
+            if args.memory:
+                df['date'] = parse_days(df['day'])
+                memory_report(df, label)
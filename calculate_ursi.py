@@ -1,48 +1,26 @@
-import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime
 
-# Load the data
-df = pd.read_pickle(r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\df_ohlcv_195stocks.pkl")
+from ursi_core import load_breadth
+from ursi_html import write_figure_html
+from ursi_stats import UrsiStats
 
-# Convert day column to datetime for proper sorting
-df['date'] = pd.to_datetime(df['day'].str.replace('_', '-'))
+# Load the daily breadth table (computed once and cached for all URSI scripts)
+daily_stats = load_breadth()[['date', 'advancing_stocks', 'total_stocks']]
 
-# Sort by stock and date to ensure chronological order
-df = df.sort_values(['stock', 'date'])
-
-# Calculate previous close for each stock
-df['prev_close'] = df.groupby('stock')['close'].shift(1)
-
-# Determine if stock is advancing (1) or declining (0)
-# Advancing: today's close > previous close
-# Declining: today's close <= previous close
-df['is_advancing'] = (df['close'] > df['prev_close']).astype(int)
-
-# Remove rows where prev_close is NaN (first day for each stock)
-df_clean = df.dropna(subset=['prev_close'])
-
-# Calculate daily URSI
-daily_stats = df_clean.groupby('date').agg({
-    'is_advancing': ['sum', 'count']
-}).reset_index()
-
-# Flatten column names
-daily_stats.columns = ['date', 'advancing_stocks', 'total_stocks']
-
-# Calculate declining stocks
+# This chart treats unchanged stocks as declining:
+# Declining = Total - Advancing
 daily_stats['declining_stocks'] = daily_stats['total_stocks'] - daily_stats['advancing_stocks']
 
-# Calculate URSI = (Advancing / (Advancing + Declining)) * 100
-# Note: Advancing + Declining = Total stocks with data for that day
+# Calculate URSI = (Advancing / Total) * 100
 daily_stats['URSI'] = (daily_stats['advancing_stocks'] / daily_stats['total_stocks']) * 100
 
-# Sort by date
-daily_stats = daily_stats.sort_values('date')
+# Summary statistics of this URSI variant in one pass
+stats = UrsiStats(rollup_columns=['advancing_stocks', 'declining_stocks']).update(daily_stats)
 
 print(f"URSI Calculation Complete!")
 print(f"Date range: {daily_stats['date'].min()} to {daily_stats['date'].max()}")
-print(f"Average URSI: {daily_stats['URSI'].mean():.2f}")
+print(f"Average URSI: {stats.mean:.2f}")
 print(f"Current URSI (latest): {daily_stats['URSI'].iloc[-1]:.2f}")
 
 # Create the interactive plot using Plotly
@@ -127,15 +105,15 @@ fig.add_annotation(
 
 # Save to HTML file
 output_file = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\ursi_chart.html"
-fig.write_html(output_file)
+write_figure_html(fig, output_file)
 
 print(f"\nHTML chart saved to: {output_file}")
 print(f"\nSummary Statistics:")
-print(f"- Minimum URSI: {daily_stats['URSI'].min():.2f}")
-print(f"- Maximum URSI: {daily_stats['URSI'].max():.2f}")
-print(f"- Days above 70 (Bullish): {(daily_stats['URSI'] > 70).sum()} days")
-print(f"- Days below 30 (Bearish): {(daily_stats['URSI'] < 30).sum()} days")
-print(f"- Days in neutral zone (30-70): {((daily_stats['URSI'] >= 30) & (daily_stats['URSI'] <= 70)).sum()} days")
+print(f"- Minimum URSI: {stats.min:.2f}")
+print(f"- Maximum URSI: {stats.max:.2f}")
+print(f"- Days above 70 (Bullish): {stats.above} days")
+print(f"- Days below 30 (Bearish): {stats.below} days")
+print(f"- Days in neutral zone (30-70): {stats.neutral} days")
 
 # Export the calculated URSI data to CSV for reference
 csv_file = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\ursi_data.csv"
@@ -1,50 +1,18 @@
-import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import json
 
-# Load the data
-df = pd.read_pickle(r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\df_ohlcv_195stocks.pkl")
+from ursi_core import load_breadth
+from ursi_html import MA_JS, embed_data, plotly_script_tag
 
-# Convert day column to datetime for proper sorting
-df['date'] = pd.to_datetime(df['day'].str.replace('_', '-'))
+# Page data embedding: 'binary' (base64 typed arrays) or 'json'
+DATA_EMBED = 'binary'
 
-# Sort by stock and date to ensure chronological order
-df = df.sort_values(['stock', 'date'])
+# Downsampling of long histories in the zoomed-out chart: 'lttb', 'minmax' or None
+# (needs the 'binary' embedding)
+LOD_METHOD = 'lttb'
 
-# Calculate previous close for each stock
-df['prev_close'] = df.groupby('stock')['close'].shift(1)
-
-# Determine if stock is advancing, declining, or unchanged
-df['is_advancing'] = (df['close'] > df['prev_close']).astype(int)
-df['is_declining'] = (df['close'] < df['prev_close']).astype(int)
-df['is_unchanged'] = (df['close'] == df['prev_close']).astype(int)
-
-# Remove rows where prev_close is NaN (first day for each stock)
-df_clean = df.dropna(subset=['prev_close'])
-
-# Calculate daily URSI
-daily_stats = df_clean.groupby('date').agg({
-    'is_advancing': 'sum',
-    'is_declining': 'sum',
-    'is_unchanged': 'sum'
-}).reset_index()
-
-# Rename columns
-daily_stats.columns = ['date', 'advancing_stocks', 'declining_stocks', 'unchanged_stocks']
-
-# Calculate URSI = (Advancing / (Advancing + Declining)) * 100
-# Note: Unchanged stocks are excluded from the calculation
-daily_stats['URSI'] = (daily_stats['advancing_stocks'] / 
-                       (daily_stats['advancing_stocks'] + daily_stats['declining_stocks'])) * 100
-
-# Calculate total stocks for reference
-daily_stats['total_stocks'] = (daily_stats['advancing_stocks'] + 
-                               daily_stats['declining_stocks'] + 
-                               daily_stats['unchanged_stocks'])
-
-# Sort by date
-daily_stats = daily_stats.sort_values('date')
+# Load the daily breadth table (computed once and cached for all URSI scripts)
+daily_stats = load_breadth()
 
 print(f"URSI Calculation Complete!")
 print(f"Date range: {daily_stats['date'].min()} to {daily_stats['date'].max()}")
@@ -52,9 +20,6 @@ print(f"Average URSI: {daily_stats['URSI'].mean():.2f}")
 print(f"Current URSI (latest): {daily_stats['URSI'].iloc[-1]:.2f}")
 print(f"Latest day - Advancing: {daily_stats['advancing_stocks'].iloc[-1]}, Declining: {daily_stats['declining_stocks'].iloc[-1]}, Unchanged: {daily_stats['unchanged_stocks'].iloc[-1]}")
 
-# Convert dates to strings for JSON serialization
-daily_stats['date_str'] = daily_stats['date'].dt.strftime('%Y-%m-%d')
-
 # Create the interactive plot using Plotly
 fig = go.Figure()
 
@@ -142,14 +107,13 @@ fig.add_annotation(
     borderwidth=1
 )
 
-# Convert figure to JSON
-fig_json = fig.to_json()
+# Figure and URSI data for JavaScript (MA prefix sums make any period O(n) in the browser)
+page_data = embed_data(fig, daily_stats,
+                       ['advancing_stocks', 'declining_stocks', 'total_stocks'], DATA_EMBED, LOD_METHOD)
 
-# Prepare URSI data for JavaScript
-ursi_data = {
-    'dates': daily_stats['date_str'].tolist(),
-    'values': daily_stats['URSI'].tolist()
-}
+# Load plotly.js locally (see ursi_html.PLOTLY_JS_MODE) so the page works offline
+output_file = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\ursi_chart.html"
+plotly_js = plotly_script_tag(output_file)
 
 # Create HTML with interactive MA input
 html_content = f"""
@@ -157,7 +121,7 @@ html_content = f"""
 <html>
 <head>
     <title>URSI Chart with Interactive Moving Average</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    {plotly_js}
     <style>
         body {{
             font-family: Arial, sans-serif;
@@ -245,29 +209,12 @@ html_content = f"""
     
     <script>
         // Store the original figure and URSI data
-        const figureData = {fig_json};
-        const ursiData = {json.dumps(ursi_data)};
-        
+{page_data}        
         // Initial plot
         Plotly.newPlot('plotDiv', figureData.data, figureData.layout);
+        enableLOD('plotDiv', ursiData);
         
-        // Function to calculate moving average
-        function calculateMA(values, period) {{
-            const ma = [];
-            for (let i = 0; i < values.length; i++) {{
-                if (i < period - 1) {{
-                    ma.push(null);
-                }} else {{
-                    let sum = 0;
-                    for (let j = 0; j < period; j++) {{
-                        sum += values[i - j];
-                    }}
-                    ma.push(sum / period);
-                }}
-            }}
-            return ma;
-        }}
-        
+{MA_JS}        
         // Function to update the moving average
         function updateMA() {{
             const maDays = parseInt(document.getElementById('maDays').value);
@@ -277,21 +224,26 @@ html_content = f"""
                 return;
             }}
             
-            if (maDays > ursiData.values.length) {{
-                document.getElementById('status').textContent = `Maximum period is ${{ursiData.values.length}} days`;
+            if (maDays > ursiData.dates.length) {{
+                document.getElementById('status').textContent = `Maximum period is ${{ursiData.dates.length}} days`;
                 return;
             }}
             
             // Calculate moving average
-            const maValues = calculateMA(ursiData.values, maDays);
+            const maValues = calculateMA(ursiData, maDays);
+            
+            // Keep the MA for zoom redraws and live updates; draw it at the current level of detail
+            ursiData.ma = maValues;
+            ursiData.maPeriod = maDays;
+            const idx = lodIndices(ursiData);
             
             // Parse dates back to Date objects
-            const dates = ursiData.dates.map(d => new Date(d));
+            const dates = pick(ursiData.dates, idx).map(d => new Date(d));
             
             // Update the MA trace
             const update = {{
                 x: [dates],
-                y: [maValues],
+                y: [pick(maValues, idx)],
                 name: [`MA-${{maDays}}`],
                 visible: [null, true],
                 'hovertemplate': [`Date: %{{x|%Y-%m-%d}}<br>MA-${{maDays}}: %{{y:.2f}}<extra></extra>`]
@@ -328,7 +280,6 @@ html_content = f"""
 """
 
 # Save to HTML file
-output_file = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\ursi_chart.html"
 with open(output_file, 'w', encoding='utf-8') as f:
     f.write(html_content)
 
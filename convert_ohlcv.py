@@ -0,0 +1,10 @@
+from ursi_core import OHLCV_FILE, OHLCV_STORE_DIR, convert_ohlcv_store
+
+# Convert the OHLCV pickle into a Parquet store partitioned by year, so the URSI
+# scripts read only `stock`, `date` and `close` for the years they need
+df = convert_ohlcv_store(OHLCV_FILE, OHLCV_STORE_DIR)
+
+print(f"OHLCV store written to: {OHLCV_STORE_DIR}")
+print(f"  - Rows: {len(df):,}")
+print(f"  - Stocks: {df['stock'].nunique()}")
+print(f"  - Years: {df['year'].min()} to {df['year'].max()}")
@@ -1,59 +1,42 @@
-import pandas as pd
 import plotly.graph_objects as go
-import json
 from datetime import datetime
 
-# Load the data
-df = pd.read_pickle(r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\df_ohlcv_195stocks.pkl")
+from ursi_core import load_breadth
+from ursi_export import build_sheets, export_sheets
+from ursi_html import MA_JS, embed_data, plotly_script_tag
+from ursi_indicators import INDICATORS, compute_indicators
+from ursi_stats import load_stats
 
-# Convert day column to datetime for proper sorting
-df['date'] = pd.to_datetime(df['day'].str.replace('_', '-'))
+# Page data embedding: 'binary' (base64 typed arrays) or 'json'
+DATA_EMBED = 'binary'
 
-# Sort by stock and date to ensure chronological order
-df = df.sort_values(['stock', 'date'])
+# Downsampling of long histories in the zoomed-out chart: 'lttb', 'minmax' or None
+# (needs the 'binary' embedding)
+LOD_METHOD = 'lttb'
 
-# Calculate previous close for each stock
-df['prev_close'] = df.groupby('stock')['close'].shift(1)
+# Indicators exported to Excel (see ursi_indicators for the spec format)
+INDICATOR_SPECS = INDICATORS
 
-# Determine if stock is advancing, declining, or unchanged
-df['is_advancing'] = (df['close'] > df['prev_close']).astype(int)
-df['is_declining'] = (df['close'] < df['prev_close']).astype(int)
-df['is_unchanged'] = (df['close'] == df['prev_close']).astype(int)
+# URSI-scale indicator lines added to the chart, hidden until toggled in the legend
+CHART_INDICATORS = {'EMA_20': 'orange', 'BB_Upper_20': 'purple', 'BB_Lower_20': 'purple'}
 
-# Remove rows where prev_close is NaN (first day for each stock)
-df_clean = df.dropna(subset=['prev_close'])
+# Analysis export: 'xlsx' (one workbook), 'parquet' or 'csv' (one file per sheet),
+# or None to skip it
+EXPORT_FORMAT = 'xlsx'
 
-# Calculate daily URSI
-daily_stats = df_clean.groupby('date').agg({
-    'is_advancing': 'sum',
-    'is_declining': 'sum',
-    'is_unchanged': 'sum'
-}).reset_index()
+# Load the daily breadth table (computed once and cached for all URSI scripts)
+daily_stats = load_breadth()
 
-# Rename columns
-daily_stats.columns = ['date', 'advancing_stocks', 'declining_stocks', 'unchanged_stocks']
+# Moving averages, EMA, Bollinger bands, McClellan oscillator and A/D line in one pass
+daily_stats = daily_stats.join(compute_indicators(daily_stats, INDICATOR_SPECS))
 
-# Calculate URSI = (Advancing / (Advancing + Declining)) * 100
-# Note: Unchanged stocks are excluded from the calculation
-daily_stats['URSI'] = (daily_stats['advancing_stocks'] / 
-                       (daily_stats['advancing_stocks'] + daily_stats['declining_stocks'])) * 100
-
-# Calculate total stocks for reference
-daily_stats['total_stocks'] = (daily_stats['advancing_stocks'] + 
-                               daily_stats['declining_stocks'] + 
-                               daily_stats['unchanged_stocks'])
-
-# Sort by date
-daily_stats = daily_stats.sort_values('date')
-
-# Calculate some example moving averages for the Excel file
-for period in [5, 10, 20, 50]:
-    daily_stats[f'MA_{period}'] = daily_stats['URSI'].rolling(window=period).mean()
+# Summary statistics, folding in only the days added since the last run
+stats = load_stats(daily_stats)
 
 print(f"URSI Calculation Complete!")
 print(f"Date range: {daily_stats['date'].min()} to {daily_stats['date'].max()}")
-print(f"Total trading days: {len(daily_stats)}")
-print(f"Average URSI: {daily_stats['URSI'].mean():.2f}")
+print(f"Total trading days: {stats.days}")
+print(f"Average URSI: {stats.mean:.2f}")
 print(f"Current URSI (latest): {daily_stats['URSI'].iloc[-1]:.2f}")
 print(f"\nLatest day statistics:")
 print(f"  - Advancing stocks: {daily_stats['advancing_stocks'].iloc[-1]}")
@@ -61,72 +44,19 @@ print(f"  - Declining stocks: {daily_stats['declining_stocks'].iloc[-1]}")
 print(f"  - Unchanged stocks: {daily_stats['unchanged_stocks'].iloc[-1]}")
 print(f"  - Total stocks: {daily_stats['total_stocks'].iloc[-1]}")
 
-# Export to Excel with multiple sheets for better organization
+# Export the analysis sheets, all built from the cached breadth table
 excel_file = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\ursi_analysis.xlsx"
-with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-    # Sheet 1: Full URSI data with moving averages
-    daily_stats.to_excel(writer, sheet_name='URSI_Daily', index=False)
-    
-    # Sheet 2: Summary statistics
-    summary_data = {
-        'Metric': [
-            'Start Date',
-            'End Date',
-            'Total Trading Days',
-            'Average URSI',
-            'Median URSI',
-            'Min URSI',
-            'Max URSI',
-            'Standard Deviation',
-            'Days Above 70 (Overbought)',
-            'Days Below 30 (Oversold)',
-            'Days in Neutral Zone (30-70)',
-            'Current URSI',
-            'Current Advancing Stocks',
-            'Current Declining Stocks',
-            'Current Unchanged Stocks'
-        ],
-        'Value': [
-            daily_stats['date'].min().strftime('%Y-%m-%d'),
-            daily_stats['date'].max().strftime('%Y-%m-%d'),
-            len(daily_stats),
-            f"{daily_stats['URSI'].mean():.2f}",
-            f"{daily_stats['URSI'].median():.2f}",
-            f"{daily_stats['URSI'].min():.2f}",
-            f"{daily_stats['URSI'].max():.2f}",
-            f"{daily_stats['URSI'].std():.2f}",
-            (daily_stats['URSI'] > 70).sum(),
-            (daily_stats['URSI'] < 30).sum(),
-            ((daily_stats['URSI'] >= 30) & (daily_stats['URSI'] <= 70)).sum(),
-            f"{daily_stats['URSI'].iloc[-1]:.2f}",
-            daily_stats['advancing_stocks'].iloc[-1],
-            daily_stats['declining_stocks'].iloc[-1],
-            daily_stats['unchanged_stocks'].iloc[-1]
-        ]
-    }
-    summary_df = pd.DataFrame(summary_data)
-    summary_df.to_excel(writer, sheet_name='Summary', index=False)
-    
-    # Sheet 3: Monthly averages
-    daily_stats['year_month'] = daily_stats['date'].dt.to_period('M')
-    monthly_avg = daily_stats.groupby('year_month').agg({
-        'URSI': 'mean',
-        'advancing_stocks': 'mean',
-        'declining_stocks': 'mean',
-        'unchanged_stocks': 'mean'
-    }).round(2)
-    monthly_avg.index = monthly_avg.index.to_timestamp()
-    monthly_avg.reset_index(inplace=True)
-    monthly_avg.columns = ['Month', 'Avg_URSI', 'Avg_Advancing', 'Avg_Declining', 'Avg_Unchanged']
-    monthly_avg.to_excel(writer, sheet_name='Monthly_Averages', index=False)
-
-print(f"\nExcel file exported to: {excel_file}")
-print(f"  - Sheet 1: URSI_Daily - Complete daily data with moving averages")
-print(f"  - Sheet 2: Summary - Statistical summary")
-print(f"  - Sheet 3: Monthly_Averages - Monthly aggregated data")
-
-# Convert dates to strings for JSON serialization
-daily_stats['date_str'] = daily_stats['date'].dt.strftime('%Y-%m-%d')
+if EXPORT_FORMAT:
+    files = export_sheets(build_sheets(daily_stats, stats), excel_file, EXPORT_FORMAT)
+    if EXPORT_FORMAT == 'xlsx':
+        print(f"\nExcel file exported to: {excel_file}")
+        print(f"  - Sheet 1: URSI_Daily - Complete daily data with moving averages")
+        print(f"  - Sheet 2: Summary - Statistical summary")
+        print(f"  - Sheet 3: Monthly_Averages - Monthly aggregated data")
+    else:
+        print(f"\nAnalysis tables exported ({EXPORT_FORMAT}):")
+        for file in files:
+            print(f"  - {file}")
 
 # Create the interactive plot using Plotly
 fig = go.Figure()
@@ -152,6 +82,18 @@ fig.add_trace(go.Scatter(
     visible=False
 ))
 
+# Indicator lines from the same table as the Excel sheet
+for column, color in CHART_INDICATORS.items():
+    fig.add_trace(go.Scatter(
+        x=daily_stats['date'],
+        y=daily_stats[column],
+        mode='lines',
+        name=column,
+        line=dict(color=color, width=1, dash='dot'),
+        visible='legendonly',
+        hovertemplate=f'{column}: %{{y:.2f}}<extra></extra>'
+    ))
+
 # Add horizontal lines at 30 and 70
 fig.add_hline(y=70, line_dash="dash", line_color="gray", line_width=1, 
               annotation_text="70 - Overbought", annotation_position="right")
@@ -217,14 +159,13 @@ fig.add_annotation(
     borderwidth=1
 )
 
-# Convert figure to JSON
-fig_json = fig.to_json()
+# Figure and URSI data for JavaScript (MA prefix sums make any period O(n) in the browser)
+page_data = embed_data(fig, daily_stats,
+                       ['advancing_stocks', 'declining_stocks', 'unchanged_stocks', 'total_stocks'], DATA_EMBED, LOD_METHOD)
 
-# Prepare URSI data for JavaScript
-ursi_data = {
-    'dates': daily_stats['date_str'].tolist(),
-    'values': daily_stats['URSI'].tolist()
-}
+# Load plotly.js locally (see ursi_html.PLOTLY_JS_MODE) so the page works offline
+output_file = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\ursi_interactive_ma.html"
+plotly_js = plotly_script_tag(output_file)
 
 # Create HTML with interactive MA input
 html_content = f"""
@@ -232,7 +173,7 @@ html_content = f"""
 <html>
 <head>
     <title>URSI Chart with Interactive Moving Average</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    {plotly_js}
     <style>
         body {{
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -395,7 +336,7 @@ html_content = f"""
             </div>
             <div class="info-item">
                 <div class="info-label">Average URSI (All-time)</div>
-                <div class="info-value">{daily_stats['URSI'].mean():.2f}%</div>
+                <div class="info-value">{stats.mean:.2f}%</div>
             </div>
             <div class="info-item">
                 <div class="info-label">Date</div>
@@ -406,29 +347,12 @@ html_content = f"""
     
     <script>
         // Store the original figure and URSI data
-        const figureData = {fig_json};
-        const ursiData = {json.dumps(ursi_data)};
-        
+{page_data}        
         // Initial plot
         Plotly.newPlot('plotDiv', figureData.data, figureData.layout);
+        enableLOD('plotDiv', ursiData);
         
-        // Function to calculate moving average
-        function calculateMA(values, period) {{
-            const ma = [];
-            for (let i = 0; i < values.length; i++) {{
-                if (i < period - 1) {{
-                    ma.push(null);
-                }} else {{
-                    let sum = 0;
-                    for (let j = 0; j < period; j++) {{
-                        sum += values[i - j];
-                    }}
-                    ma.push(sum / period);
-                }}
-            }}
-            return ma;
-        }}
-        
+{MA_JS}        
         // Function to update the moving average
         function updateMA() {{
             const maDays = parseInt(document.getElementById('maDays').value);
@@ -440,23 +364,28 @@ html_content = f"""
                 return;
             }}
             
-            if (maDays > ursiData.values.length) {{
-                document.getElementById('status').textContent = `⚠️ Maximum period is ${{ursiData.values.length}} days`;
+            if (maDays > ursiData.dates.length) {{
+                document.getElementById('status').textContent = `⚠️ Maximum period is ${{ursiData.dates.length}} days`;
                 document.getElementById('status').style.backgroundColor = '#ffebee';
                 document.getElementById('status').style.color = '#c62828';
                 return;
             }}
             
             // Calculate moving average
-            const maValues = calculateMA(ursiData.values, maDays);
+            const maValues = calculateMA(ursiData, maDays);
+            
+            // Keep the MA for zoom redraws and live updates; draw it at the current level of detail
+            ursiData.ma = maValues;
+            ursiData.maPeriod = maDays;
+            const idx = lodIndices(ursiData);
             
             // Parse dates back to Date objects
-            const dates = ursiData.dates.map(d => new Date(d));
+            const dates = pick(ursiData.dates, idx).map(d => new Date(d));
             
             // Update the MA trace
             const update = {{
                 x: [dates],
-                y: [maValues],
+                y: [pick(maValues, idx)],
                 name: [`MA-${{maDays}}`],
                 visible: [null, true],
                 'hovertemplate': [`Date: %{{x|%Y-%m-%d}}<br>MA-${{maDays}}: %{{y:.2f}}<extra></extra>`]
@@ -497,7 +426,6 @@ html_content = f"""
 """
 
 # Save to new HTML file
-output_file = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\ursi_interactive_ma.html"
 with open(output_file, 'w', encoding='utf-8') as f:
     f.write(html_content)
 
@@ -0,0 +1,159 @@
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+from ursi_core import (DATA_DIR, compute_group_breadth, default_source, load_breadth,
+                       load_breadth_input, moving_average, prefix_sums, source_signature)
+from ursi_universe import basket_breadth
+
+# Stock -> group memberships for `group=` queries: CSV with stock, group columns
+# (a stock may appear once per group, e.g. its sector and VN30)
+GROUPS_FILE = os.path.join(DATA_DIR, 'ursi_groups.csv')
+
+# Distinct queries kept in the result cache
+CACHE_SIZE = 256
+
+# Columns returned per day, as in ursi_data.csv plus the unchanged count
+RESULT_COLUMNS = ['date', 'advancing_stocks', 'declining_stocks', 'unchanged_stocks', 'total_stocks', 'URSI']
+
+
+class QueryError(ValueError):
+    """Invalid /ursi query parameters."""
+
+
+def parse_query(params):
+    """Normalised (from, to, group, ma, tickers) cache key from query parameters.
+
+    `params` maps names to single values (or lists, as from urllib.parse.parse_qs).
+    `tickers` is a comma-separated basket, kept as a sorted tuple.
+    """
+    def get(name):
+        value = params.get(name)
+        if isinstance(value, list):
+            value = value[-1] if value else None
+        return value or None
+
+    try:
+        start = pd.Timestamp(get('from')) if get('from') else None
+        end = pd.Timestamp(get('to')) if get('to') else None
+    except ValueError as e:
+        raise QueryError(f"invalid date: {e}")
+    ma = get('ma')
+    if ma is not None:
+        if not ma.isdigit() or int(ma) < 1:
+            raise QueryError(f"ma must be a positive number of days, got {ma!r}")
+        ma = int(ma)
+    tickers = get('tickers')
+    if tickers is not None:
+        tickers = tuple(sorted({t.strip().upper() for t in tickers.split(',') if t.strip()})) or None
+    if tickers is not None and get('group') is not None:
+        raise QueryError("use either group or tickers, not both")
+    return start, end, get('group'), ma, tickers
+
+
+class UrsiQuery:
+    """URSI series for a date range, group or ticker basket and MA period, with an LRU result cache.
+
+    Cached results are keyed on the normalised query and all dropped as soon as
+    the OHLCV source changes (new days appended), so repeated queries are served
+    from memory and never stale. The MA is computed over the full history before
+    the range is cut, so the first days of a range have a complete window.
+    """
+
+    def __init__(self, path=None, groups_file=GROUPS_FILE, cache_size=CACHE_SIZE):
+        self.path = path
+        self.groups_file = groups_file
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.group_stats = None
+        self.signature = None
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def refresh(self):
+        """Drop cached results if the source changed since they were computed."""
+        signature = source_signature(self.path or default_source())
+        with self.lock:
+            if signature != self.signature:
+                self.cache.clear()
+                self.group_stats = None
+                self.signature = signature
+
+    def series(self, group=None, tickers=None):
+        """Full daily breadth history, overall, for one group or for a ticker basket."""
+        if tickers is not None:
+            # Masked popcount over the persisted state matrix
+            stats = basket_breadth(tickers, self.path)
+            if len(stats) == 0:
+                raise QueryError(f"no price data for tickers {', '.join(tickers)}")
+            return stats
+        if group is None:
+            return load_breadth(self.path)
+        if self.group_stats is None:
+            if not (self.groups_file and os.path.exists(self.groups_file)):
+                raise QueryError("group queries need a groups file with stock, group columns")
+            groups = pd.read_csv(self.groups_file, dtype=str)
+            df, _ = load_breadth_input(self.path or default_source())
+            self.group_stats = compute_group_breadth(df, groups, engine='numpy')
+        stats = self.group_stats[self.group_stats['group'] == group]
+        if len(stats) == 0:
+            raise QueryError(f"unknown group {group!r}")
+        return stats.drop(columns='group').reset_index(drop=True)
+
+    def compute(self, start, end, group, ma, tickers=None):
+        """Rows for one normalised query, as JSON-safe records."""
+        stats = self.series(group, tickers)[RESULT_COLUMNS]
+        if ma is not None:
+            prefix, nan_prefix = prefix_sums(stats['URSI'])
+            stats[f'MA{ma}'] = moving_average(prefix, nan_prefix, ma)
+        if start is not None:
+            stats = stats[stats['date'] >= start]
+        if end is not None:
+            stats = stats[stats['date'] <= end]
+
+        records = []
+        for row in stats.itertuples(index=False):
+            record = dict(zip(stats.columns, row))
+            record['date'] = record['date'].strftime('%Y-%m-%d')
+            for name, value in record.items():
+                if isinstance(value, float) and math.isnan(value):
+                    record[name] = None
+                elif name.endswith('_stocks'):
+                    record[name] = int(value)
+                elif name != 'date':
+                    record[name] = float(value)
+            records.append(record)
+        return records
+
+    def query(self, params):
+        """JSON body (bytes) answering the query parameters `params`."""
+        key = parse_query(params)
+        self.refresh()
+        with self.lock:
+            signature = self.signature
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+
+        start, end, group, ma, tickers = key
+        body = json.dumps({
+            'from': start.strftime('%Y-%m-%d') if start is not None else None,
+            'to': end.strftime('%Y-%m-%d') if end is not None else None,
+            'group': group,
+            'tickers': list(tickers) if tickers is not None else None,
+            'ma': ma,
+            'rows': self.compute(start, end, group, ma, tickers),
+        }).encode('utf-8')
+
+        with self.lock:
+            # Not cached if the source changed while computing
+            if self.signature == signature:
+                self.cache[key] = body
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return body
@@ -0,0 +1,156 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+from ursi_core import load_breadth, load_close_matrix, prefix_sums
+
+# Default sweep grid
+MA_PERIODS = [1, 3, 5, 10, 20, 50]
+UPPER_THRESHOLDS = [60, 65, 70, 75, 80]
+LOWER_THRESHOLDS = [20, 25, 30, 35, 40]
+HOLDING_PERIODS = [1, 5, 10, 20, 60]
+
+SWEEP_COLUMNS = [
+    'ma_period', 'upper', 'lower', 'holding_period',
+    'oversold_signals', 'oversold_hit_rate', 'oversold_avg_return',
+    'overbought_signals', 'overbought_hit_rate', 'overbought_avg_return',
+    'signals', 'hit_rate', 'avg_return',
+]
+
+
+def matrix_index(closes, prev_close, present, dates, stocks):
+    """Equal-weight index level per date of a close matrix from load_close_matrix() (first date = 1).
+
+    Each day's return is the mean of the stocks' returns from their previous
+    close, so stocks missing a session do not create jumps.
+    """
+    returns = np.where(present, np.asarray(closes) / prev_close - 1, np.nan)
+    counted = ~np.isnan(returns)
+    totals = np.where(counted, returns, 0.0).sum(axis=1)
+    n = counted.sum(axis=1)
+    daily = np.divide(totals, n, out=np.zeros(len(n)), where=n > 0)
+    # Only days on which some stock traded
+    traded = np.asarray(present).any(axis=1)
+    return pd.Series(np.cumprod(1 + daily[traded]), index=dates[traded], name='index_level')
+
+
+def _ma_grid(values, periods):
+    """(periods x days) moving averages of `values`, all from one set of prefix sums."""
+    prefix, nan_prefix = prefix_sums(values)
+    periods = np.asarray(periods)[:, None]
+    end = np.arange(1, len(values) + 1)[None, :]
+    start = np.maximum(end - periods, 0)
+    complete = (end >= periods) & (nan_prefix[end] - nan_prefix[start] == 0)
+    return np.where(complete, (prefix[end] - prefix[start]) / periods, np.nan)
+
+
+def _zone_entries(ma, thresholds, below):
+    """(periods x thresholds x days) days on which the MA enters the zone beyond each threshold."""
+    ma = ma[:, None, :]
+    thresholds = np.asarray(thresholds, dtype=float)[None, :, None]
+    inside = ma < thresholds if below else ma > thresholds
+    entered = inside.copy()
+    entered[..., 1:] &= ~inside[..., :-1]
+    return entered
+
+
+def _signal_stats(entries, forward, sign):
+    """Signal count, hit rate and mean signed forward return per (period, threshold, holding period).
+
+    One matrix product over all combinations: entries (P x T x days) against the
+    forward returns (holding periods x days).
+    """
+    p, t, n = entries.shape
+    known = ~np.isnan(forward)
+    flat = entries.reshape(p * t, n).astype(np.float64)
+    signals = flat @ known.T.astype(np.float64)
+    signed = sign * np.where(known, forward, 0.0)
+    hits = flat @ (signed > 0).T.astype(np.float64)
+    total = flat @ signed.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hit_rate = hits / signals
+        avg_return = total / signals
+    shape = (p, t, forward.shape[0])
+    return signals.reshape(shape), hit_rate.reshape(shape), avg_return.reshape(shape), \
+        hits.reshape(shape), total.reshape(shape)
+
+
+def sweep(daily_stats, index_level, ma_periods=MA_PERIODS, uppers=UPPER_THRESHOLDS,
+          lowers=LOWER_THRESHOLDS, holding_periods=HOLDING_PERIODS):
+    """Evaluate every (MA period, upper, lower, holding period) URSI band signal at once.
+
+    The URSI MA entering the zone below `lower` is a buy signal and entering the
+    zone above `upper` a sell signal; each is scored by the index return over the
+    next `holding_period` days (signed, so a hit is a rise after oversold and a
+    fall after overbought). The MAs come from one set of prefix sums and the
+    whole grid is evaluated with broadcasting and matrix products, no loop per
+    combination. Returns one row per combination with lower < upper.
+    """
+    level = pd.Series(index_level).reindex(pd.DatetimeIndex(daily_stats['date'])).to_numpy(dtype=float)
+    holding_periods = np.asarray(holding_periods)
+    n = len(level)
+
+    # (holding periods x days) forward returns from each day's close
+    ahead = np.arange(n)[None, :] + holding_periods[:, None]
+    forward = np.full((len(holding_periods), n), np.nan)
+    inside = ahead < n
+    forward[inside] = level[ahead[inside]] / np.broadcast_to(level, ahead.shape)[inside] - 1
+
+    ma = _ma_grid(daily_stats['URSI'].to_numpy(dtype=float), ma_periods)
+    os_signals, os_rate, os_return, os_hits, os_total = \
+        _signal_stats(_zone_entries(ma, lowers, below=True), forward, 1)
+    ob_signals, ob_rate, ob_return, ob_hits, ob_total = \
+        _signal_stats(_zone_entries(ma, uppers, below=False), forward, -1)
+
+    # Full (period x upper x lower x holding) grid by broadcasting both sides
+    shape = (len(ma_periods), len(uppers), len(lowers), len(holding_periods))
+    grid = np.meshgrid(ma_periods, uppers, lowers, holding_periods, indexing='ij')
+
+    def os_side(values):
+        return np.broadcast_to(values[:, None, :, :], shape)
+
+    def ob_side(values):
+        return np.broadcast_to(values[:, :, None, :], shape)
+
+    signals = os_side(os_signals) + ob_side(ob_signals)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hit_rate = (os_side(os_hits) + ob_side(ob_hits)) / signals
+        avg_return = (os_side(os_total) + ob_side(ob_total)) / signals
+
+    results = pd.DataFrame({
+        'ma_period': grid[0].ravel(),
+        'upper': grid[1].ravel(),
+        'lower': grid[2].ravel(),
+        'holding_period': grid[3].ravel(),
+        'oversold_signals': os_side(os_signals).ravel().astype(np.int64),
+        'oversold_hit_rate': os_side(os_rate).ravel(),
+        'oversold_avg_return': os_side(os_return).ravel(),
+        'overbought_signals': ob_side(ob_signals).ravel().astype(np.int64),
+        'overbought_hit_rate': ob_side(ob_rate).ravel(),
+        'overbought_avg_return': ob_side(ob_return).ravel(),
+        'signals': signals.ravel().astype(np.int64),
+        'hit_rate': hit_rate.ravel(),
+        'avg_return': avg_return.ravel(),
+    })
+    return results[results['lower'] < results['upper']].reset_index(drop=True)[SWEEP_COLUMNS]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep URSI band signals against forward index returns')
+    parser.add_argument('--ma', type=int, nargs='+', default=MA_PERIODS, help='URSI MA periods')
+    parser.add_argument('--upper', type=float, nargs='+', default=UPPER_THRESHOLDS)
+    parser.add_argument('--lower', type=float, nargs='+', default=LOWER_THRESHOLDS)
+    parser.add_argument('--hold', type=int, nargs='+', default=HOLDING_PERIODS, help='holding periods (days)')
+    parser.add_argument('--min-signals', type=int, default=10, help='combinations shown need this many signals')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help='write the full sweep to this CSV file')
+    args = parser.parse_args()
+
+    daily_stats = load_breadth()
+    results = sweep(daily_stats, matrix_index(*load_close_matrix()), args.ma, args.upper, args.lower, args.hold)
+    print(f"{len(results):,} parameter sets over {len(daily_stats)} trading days")
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Sweep written to: {args.output}")
+    best = results[results['signals'] >= args.min_signals].sort_values('avg_return', ascending=False)
+    print(best.head(args.top).to_string(index=False, float_format='{:.4f}'.format))
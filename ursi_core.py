@@ -0,0 +1,933 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Shared input and cache locations
+DATA_DIR = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training"
+OHLCV_FILE = os.path.join(DATA_DIR, 'df_ohlcv_195stocks.pkl')
+BREADTH_CACHE_FILE = os.path.join(DATA_DIR, 'ursi_breadth_cache.pkl')
+
+# Columnar copy of the OHLCV input, partitioned by year (see convert_ohlcv.py)
+OHLCV_STORE_DIR = os.path.join(DATA_DIR, 'ohlcv_store')
+
+# Each stock's last row per month, kept inside the store for seeding windowed
+# loads (the leading underscore keeps it out of the dataset)
+STORE_MONTH_CLOSES = '_month_closes.parquet'
+
+# Price columns downcast to float32 by compact_ohlcv
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+# The only input columns the breadth computation needs
+BREADTH_INPUT_COLUMNS = ['stock', 'date', 'close']
+
+# Input day format, e.g. 2025_06_30
+DAY_FORMAT = '%Y_%m_%d'
+
+# Parsed dates are cached next to the pickle as <pickle>.dates.npz
+DATES_CACHE_SUFFIX = '.dates.npz'
+
+# Bump when compute_breadth changes so stale caches are recomputed
+CACHE_VERSION = 1
+
+# Memory-mapped (dates x stocks) close matrix builds shared by scripts and
+# workers (see write_close_matrix)
+CLOSE_MATRIX_DIR = os.path.join(DATA_DIR, 'ursi_close_matrix')
+
+# Rows per batch when streaming the columnar store
+CHUNK_ROWS = 1_000_000
+
+# Breadth engines selectable through compute_breadth(engine=...)
+ENGINES = ('pandas', 'numpy')
+
+BREADTH_COLUMNS = ['date', 'advancing_stocks', 'declining_stocks', 'unchanged_stocks', 'URSI', 'total_stocks']
+
+# Extra columns of compute_breadth_metrics()
+METRIC_COLUMNS = ['up_volume', 'down_volume', 'up_down_volume_ratio', 'new_highs', 'new_lows', 'pct_above_ma']
+
+# Input columns compute_breadth_metrics() uses when present
+METRIC_INPUT_COLUMNS = BREADTH_INPUT_COLUMNS + ['high', 'low', 'volume']
+
+# Sessions looked back for new highs/lows (52 weeks), and the per-stock MA period
+NEW_HIGH_WINDOW = 252
+STOCK_MA_PERIOD = 50
+
+# Share of a per-stock window's sessions the stock must have traded in for the
+# window to count (compute_breadth_metrics)
+MIN_OBSERVED_SHARE = 0.8
+
+# In-process cache, keyed on (source path, source signature)
+_breadth_memo = {}
+
+
+def source_signature(path):
+    """Cheap fingerprint of a source file (or store directory) used to invalidate caches."""
+    if os.path.isdir(path):
+        stats = [os.stat(os.path.join(root, name))
+                 for root, _, names in os.walk(path) for name in names]
+        return (CACHE_VERSION, max((st.st_mtime_ns for st in stats), default=0),
+                sum(st.st_size for st in stats))
+    st = os.stat(path)
+    return (CACHE_VERSION, st.st_mtime_ns, st.st_size)
+
+
+def _atomic_write(path, write):
+    """Call `write(f)` on a private temp file next to `path`, then rename it over `path`.
+
+    Concurrent writers each rename a complete file, so readers never see a partial one.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def read_cache(cache_file):
+    """Contents of a pickled cache file, or None when it is missing or unreadable."""
+    if not cache_file or not os.path.exists(cache_file):
+        return None
+    try:
+        return pd.read_pickle(cache_file)
+    except Exception:
+        # Truncated by an interrupted write, or from an incompatible version
+        return None
+
+
+def write_cache(obj, cache_file):
+    """Pickle `obj` to `cache_file` atomically (see _atomic_write)."""
+    _atomic_write(cache_file, lambda f: pd.to_pickle(obj, f))
+
+
+def read_arrays(npz_file, names):
+    """Arrays `names` of an .npz file as a dict, or None when it is missing, unreadable or lacks one."""
+    if not npz_file or not os.path.exists(npz_file):
+        return None
+    try:
+        with np.load(npz_file) as saved:
+            return {name: saved[name] for name in names}
+    except Exception:
+        # Truncated by an interrupted write, or written by an older version
+        return None
+
+
+def write_arrays(npz_file, compressed=False, **arrays):
+    """Save `arrays` to an .npz file atomically (see _atomic_write)."""
+    save = np.savez_compressed if compressed else np.savez
+    _atomic_write(npz_file, lambda f: save(f, **arrays))
+
+
+def default_source():
+    """The columnar store when it is at least as new as the pickle, else the pickle."""
+    if os.path.isdir(OHLCV_STORE_DIR):
+        if not os.path.exists(OHLCV_FILE) or \
+                source_signature(OHLCV_STORE_DIR)[1] >= os.stat(OHLCV_FILE).st_mtime_ns:
+            return OHLCV_STORE_DIR
+    return OHLCV_FILE
+
+
+def parse_days(days):
+    """Parse `YYYY_MM_DD` day strings, converting each distinct day only once."""
+    codes, uniques = pd.factorize(days)
+    parsed = pd.to_datetime(uniques, format=DAY_FORMAT).to_numpy()
+    dates = parsed[codes]
+    # factorize marks missing days with -1
+    dates[codes < 0] = np.datetime64('NaT')
+    return pd.Series(dates, index=days.index, name='date')
+
+
+def load_dates(path, days):
+    """Parsed `date` column for the pickle at `path`, cached in a sidecar .npz file."""
+    cache_file = path + DATES_CACHE_SUFFIX
+    signature = np.array(source_signature(path))
+    cached = read_arrays(cache_file, ['date', 'signature'])
+    if cached is not None and np.array_equal(cached['signature'], signature) and \
+            len(cached['date']) == len(days):
+        return pd.Series(cached['date'], index=days.index, name='date')
+
+    dates = parse_days(days)
+    write_arrays(cache_file, date=dates.to_numpy(), signature=signature)
+    return dates
+
+
+def load_ohlcv(path=OHLCV_FILE):
+    """Load the OHLCV pickle and add a datetime `date` column parsed from `day`."""
+    df = pd.read_pickle(path)
+    df['date'] = load_dates(path, df['day'])
+    return df
+
+
+def compact_ohlcv(df):
+    """Downcast a long-format OHLCV frame to compact dtypes.
+
+    `stock` becomes categorical, prices float32 and volume the smallest integer
+    type that fits; the `day` strings are dropped once a `date` column exists.
+    """
+    columns = {}
+    for name, col in df.items():
+        if name == 'day' and 'date' in df:
+            continue
+        if name == 'stock':
+            col = col.astype('category')
+        elif name in PRICE_COLUMNS:
+            col = col.astype(np.float32)
+        elif name == 'volume':
+            col = pd.to_numeric(col, downcast='integer')
+        columns[name] = col
+    return pd.DataFrame(columns, index=df.index)
+
+
+def convert_ohlcv_store(path=OHLCV_FILE, store_dir=OHLCV_STORE_DIR):
+    """Rewrite the OHLCV pickle as a Parquet dataset partitioned by year (needs pyarrow)."""
+    df = compact_ohlcv(load_ohlcv(path))
+    # Date-ordered rows keep row-group statistics tight for date filters
+    df = df.sort_values(['date', 'stock']).reset_index(drop=True)
+    df['year'] = df['date'].dt.year
+
+    # partition_cols appends to an existing dataset, so start from an empty directory
+    if os.path.isdir(store_dir):
+        shutil.rmtree(store_dir)
+    df.to_parquet(store_dir, partition_cols=['year'], index=False)
+    write_month_closes(df, store_dir)
+    return df
+
+
+def _month_closes(df):
+    """Last stock/date/close row of each stock in each calendar month of `df`."""
+    df = df[BREADTH_INPUT_COLUMNS].assign(month=df['date'].dt.to_period('M'))
+    df = df.sort_values(['stock', 'date']).drop_duplicates(['stock', 'month'], keep='last')
+    return df[BREADTH_INPUT_COLUMNS].astype({'stock': str}).reset_index(drop=True)
+
+
+def write_month_closes(df, store_dir=OHLCV_STORE_DIR):
+    """Save the per-stock monthly last closes of the store's rows `df` (see store_last_close)."""
+    closes = _month_closes(df)
+    _atomic_write(os.path.join(store_dir, STORE_MONTH_CLOSES), lambda f: closes.to_parquet(f, index=False))
+
+
+def load_ohlcv_store(store_dir=OHLCV_STORE_DIR, columns=BREADTH_INPUT_COLUMNS, start=None, end=None):
+    """Read `columns` for dates in [start, end] from the year-partitioned store.
+
+    Year filters prune whole partitions before the date filter is applied, so only
+    the requested columns of the requested years are read.
+    """
+    filters = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters += [('year', '>=', start.year), ('date', '>=', start)]
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters += [('year', '<=', end.year), ('date', '<=', end)]
+    return pd.read_parquet(store_dir, columns=list(columns) if columns else None,
+                           filters=filters or None)
+
+
+def last_rows_by_stock(df):
+    """Latest stock/date/close row of each stock in `df`, sorted by stock name."""
+    df = df[BREADTH_INPUT_COLUMNS].sort_values(['stock', 'date']).drop_duplicates('stock', keep='last')
+    return df.astype({'stock': str}).sort_values('stock').reset_index(drop=True)
+
+
+def last_close_by_stock(df):
+    """Latest close of each stock in `df`, as a Series indexed by stock name."""
+    df = last_rows_by_stock(df)
+    return pd.Series(df['close'].to_numpy(), index=df['stock'].to_numpy(), name='close')
+
+
+def store_last_close(store_dir, before):
+    """Each stock's last close strictly before `before`, however long ago it traded.
+
+    Months before `before`'s month come from the store's monthly last-close
+    table, so only the rows of that month up to `before` are read. Stores
+    written without the table get it on first use.
+    """
+    before = pd.Timestamp(before)
+    month_start = before.to_period('M').to_timestamp()
+    month_file = os.path.join(store_dir, STORE_MONTH_CLOSES)
+    if not os.path.exists(month_file):
+        write_month_closes(pd.read_parquet(store_dir, columns=BREADTH_INPUT_COLUMNS), store_dir)
+    months = pd.read_parquet(month_file, filters=[('date', '<', month_start)])
+    recent = pd.read_parquet(store_dir, columns=BREADTH_INPUT_COLUMNS,
+                             filters=[('year', '==', before.year), ('date', '>=', month_start),
+                                      ('date', '<', before)])
+    return last_close_by_stock(pd.concat([months, recent], ignore_index=True))
+
+
+def load_breadth_input(path, start=None, end=None, columns=BREADTH_INPUT_COLUMNS, seed=True):
+    """Breadth input rows for [start, end] plus the last close before `start`.
+
+    Returns (df, last_close); `path` may be the OHLCV pickle or the columnar store.
+    `columns` beyond stock/date/close (e.g. METRIC_INPUT_COLUMNS) are read when
+    the source has them. With seed=False the last closes are not looked up
+    (last_close is None), for callers that keep their own.
+    """
+    if os.path.isdir(path):
+        import pyarrow.dataset as ds
+
+        available = ds.dataset(path, format='parquet', partitioning='hive').schema.names
+        columns = [c for c in columns if c in available]
+        df = compact_ohlcv(load_ohlcv_store(path, columns=columns, start=start, end=end))
+        last_close = store_last_close(path, start) if seed and start is not None else None
+        return df, last_close
+
+    df = load_ohlcv(path)
+    df = compact_ohlcv(df[[c for c in columns if c in df]])
+    last_close = None
+    if start is not None:
+        if seed:
+            last_close = last_close_by_stock(df[df['date'] < start])
+        df = df[df['date'] >= start]
+    if end is not None:
+        df = df[df['date'] <= end]
+    return df, last_close
+
+
+def pivot_values(df, columns=('close',)):
+    """Pivot value columns into dense (dates x stocks) arrays.
+
+    Returns (values, present, dates, stocks) with `values` a dict of arrays keyed
+    by column; `present` marks cells that had a row, so a NaN close is kept apart
+    from a missing trading day.
+    """
+    stock_codes, stocks = pd.factorize(df['stock'], sort=True)
+    date_codes, dates = pd.factorize(df['date'], sort=True)
+    values = {}
+    for name in columns:
+        # float32 input stays float32; anything else is widened to float64
+        dtype = np.result_type(df[name].dtype, np.float32)
+        grid = np.full((len(dates), len(stocks)), np.nan, dtype=dtype)
+        grid[date_codes, stock_codes] = df[name].to_numpy(dtype=dtype)
+        values[name] = grid
+    present = np.zeros((len(dates), len(stocks)), dtype=bool)
+    present[date_codes, stock_codes] = True
+    return values, present, pd.DatetimeIndex(dates), pd.Index(stocks)
+
+
+def pivot_closes(df):
+    """Pivot closes into a dense (dates x stocks) array.
+
+    Returns (closes, present, dates, stocks); `present` marks cells that had a row,
+    so a NaN close is kept apart from a missing trading day.
+    """
+    values, present, dates, stocks = pivot_values(df)
+    return values['close'], present, dates, stocks
+
+
+def _prev_closes(closes, present, stocks, last_close=None):
+    """Each stock's previous close on the dense grid, NaN where it has none."""
+    n_dates, n_stocks = closes.shape
+
+    # Row of each stock's latest observation strictly before each date
+    # (a stock's previous close is its previous row, not the previous calendar date)
+    last_row = np.where(present, np.arange(n_dates)[:, None], -1)
+    np.maximum.accumulate(last_row, axis=0, out=last_row)
+    prev_row = np.empty_like(last_row)
+    prev_row[0] = -1
+    prev_row[1:] = last_row[:-1]
+
+    prev_close = closes[np.maximum(prev_row, 0), np.arange(n_stocks)]
+    if last_close is not None and len(last_close) > 0:
+        seed = last_close.reindex(stocks).to_numpy(dtype=closes.dtype)
+        prev_close = np.where(prev_row >= 0, prev_close, seed)
+    else:
+        prev_close[prev_row < 0] = np.nan
+    return prev_close
+
+
+def _classify_changes(closes, prev_close, present):
+    """Sign of each close change against `prev_close`, and the cells that have a previous close."""
+    # Same rows as dropna(subset=['prev_close']) in the pandas engine
+    valid = present & ~np.isnan(prev_close)
+    change = np.sign(closes - prev_close)
+    return change, valid
+
+
+def _close_changes(closes, present, stocks, last_close=None):
+    """Sign of each close change on the dense grid, and the cells that have a previous close."""
+    return _classify_changes(closes, _prev_closes(closes, present, stocks, last_close), present)
+
+
+def _count_changes(change, valid, dates):
+    """Advancing/declining/unchanged counts per date, for dates with any previous close."""
+    keep = valid.any(axis=1)
+    return pd.DataFrame({
+        'date': dates[keep],
+        'advancing_stocks': (change > 0).sum(axis=1)[keep],
+        'declining_stocks': (change < 0).sum(axis=1)[keep],
+        'unchanged_stocks': ((change == 0) & valid).sum(axis=1)[keep],
+    })
+
+
+def _classify_numpy(df, last_close=None):
+    """Sign of each close change on the dense grid.
+
+    Returns (change, valid, dates, stocks); `valid` marks cells with a previous close.
+    """
+    closes, present, dates, stocks = pivot_closes(df)
+    change, valid = _close_changes(closes, present, stocks, last_close)
+    return change, valid, dates, stocks
+
+
+def _breadth_numpy(df, last_close=None):
+    """Dense engine: sign of the close change along the time axis, reduced per date."""
+    change, valid, dates, _ = _classify_numpy(df, last_close)
+    return _count_changes(change, valid, dates)
+
+
+def _group_breadth_numpy(df, pairs, last_close=None):
+    """Dense engine per group: one (dates x stocks) @ (stocks x groups) product per state."""
+    change, valid, dates, stocks = _classify_numpy(df, last_close)
+    group_codes, groups = pd.factorize(pairs['group'], sort=True)
+    stock_pos = pd.Index(stocks.astype(str)).get_indexer(pairs['stock'])
+    known = stock_pos >= 0
+
+    # float32 products go through BLAS and are exact for counts below 2**24
+    member = np.zeros((len(stocks), len(groups)), dtype=np.float32)
+    member[stock_pos[known], group_codes[known]] = 1
+    counts = {
+        'advancing_stocks': (change > 0).astype(np.float32) @ member,
+        'declining_stocks': (change < 0).astype(np.float32) @ member,
+        'unchanged_stocks': ((change == 0) & valid).astype(np.float32) @ member,
+    }
+    keep = (valid.astype(np.float32) @ member) > 0
+
+    date_idx, group_idx = np.nonzero(keep)
+    group_stats = pd.DataFrame({'group': np.asarray(groups)[group_idx], 'date': dates[date_idx]})
+    for name, count in counts.items():
+        group_stats[name] = count[date_idx, group_idx].astype(np.int64)
+    return group_stats
+
+
+def _flags_pandas(df, last_close=None):
+    """Per-row bool advancing/declining/unchanged flags for rows with a previous close."""
+    df = df[['stock', 'date', 'close']].sort_values(['stock', 'date'])
+
+    # Calculate previous close for each stock
+    prev_close = df.groupby('stock', observed=True)['close'].shift(1)
+
+    # Seed each stock's first row with a previously known close
+    if last_close is not None and len(last_close) > 0:
+        first_row = (~df['stock'].duplicated()).to_numpy()
+        seed = last_close.reindex(df['stock'].to_numpy()[first_row]).to_numpy(dtype=prev_close.dtype)
+        prev_close[first_row] = seed
+
+    # Keep rows with a previous close (drops the first day for each stock)
+    has_prev = prev_close.notna()
+    close = df['close'][has_prev]
+    prev_close = prev_close[has_prev]
+
+    # Determine if stock is advancing, declining, or unchanged
+    return pd.DataFrame({
+        'stock': df['stock'][has_prev],
+        'date': df['date'][has_prev],
+        'advancing_stocks': close > prev_close,
+        'declining_stocks': close < prev_close,
+        'unchanged_stocks': close == prev_close,
+    })
+
+
+def _breadth_pandas(df, last_close=None):
+    """Long-format engine: groupby shift, per-row flags, groupby-date sum."""
+    flags = _flags_pandas(df, last_close).drop(columns='stock')
+    return flags.groupby('date').sum().reset_index()
+
+
+def _group_breadth_pandas(df, pairs, last_close=None):
+    """Long-format engine per group: flags joined to memberships, summed per (group, date)."""
+    flags = _flags_pandas(df, last_close)
+    flags['stock'] = flags['stock'].astype(str)
+    flags = flags.merge(pairs, on='stock').drop(columns='stock')
+    return flags.groupby(['group', 'date']).sum().reset_index()
+
+
+def _add_ursi(stats):
+    """Add URSI and total_stocks columns to a table of advancing/declining/unchanged counts."""
+    # URSI = (Advancing / (Advancing + Declining)) * 100, unchanged stocks excluded
+    stats['URSI'] = (stats['advancing_stocks'] /
+                     (stats['advancing_stocks'] + stats['declining_stocks'])) * 100
+    stats['total_stocks'] = (stats['advancing_stocks'] +
+                             stats['declining_stocks'] +
+                             stats['unchanged_stocks'])
+    return stats
+
+
+def group_pairs(groups):
+    """Normalise a stock->group mapping into a (stock, group) membership frame.
+
+    `groups` may be a dict or Series mapping each stock to one group or to a list
+    of groups (e.g. a sector plus VN30), or a frame with `stock` and `group` columns.
+    """
+    if isinstance(groups, pd.DataFrame):
+        pairs = groups[['stock', 'group']]
+    else:
+        groups = pd.Series(groups).explode().dropna()
+        pairs = pd.DataFrame({'stock': groups.index, 'group': groups.to_numpy()})
+    pairs = pairs.astype({'stock': str}).drop_duplicates()
+    return pairs.reset_index(drop=True)
+
+
+def _date_shards(df, n_shards):
+    """Split `df` into up to `n_shards` frames covering consecutive date ranges."""
+    dates = np.sort(df['date'].unique())
+    bounds = np.array_split(dates, min(n_shards, len(dates)))
+    return [df[(df['date'] >= b[0]) & (df['date'] <= b[-1])] for b in bounds if len(b)]
+
+
+def _sharded_breadth(df, last_close, engine, executor, n_shards):
+    """compute_breadth over date shards run on `executor`.
+
+    Each shard's previous closes are seeded with the last close of every stock in
+    the shards before it, so shard boundaries classify exactly like the serial path.
+    """
+    shards = _date_shards(df, n_shards or os.cpu_count() or 1)
+    seeds = []
+    seed = last_close
+    for shard in shards:
+        seeds.append(seed)
+        latest = last_close_by_stock(shard)
+        seed = latest if seed is None or len(seed) == 0 else latest.combine_first(seed)
+
+    futures = [executor.submit(compute_breadth, shard, seed, engine)
+               for shard, seed in zip(shards, seeds)]
+    daily_stats = pd.concat([f.result() for f in futures], ignore_index=True)
+    return daily_stats.sort_values('date').reset_index(drop=True)
+
+
+def compute_breadth(df, last_close=None, engine='pandas', executor=None, n_shards=None):
+    """Daily advancing/declining/unchanged counts and URSI from a long-format frame.
+
+    `df` needs `stock`, `date` and `close`. `last_close` is an optional Series
+    (indexed by stock) used as the previous close of each stock's first row.
+    `engine` is 'pandas' (groupby/shift) or 'numpy' (dense dates x stocks array);
+    both give the same table. With an `executor` (e.g. a ProcessPoolExecutor) the
+    dates are split into `n_shards` ranges (default: one per CPU) computed in parallel.
+    """
+    if executor is not None:
+        return _sharded_breadth(df, last_close, engine, executor, n_shards)
+
+    if engine == 'pandas':
+        daily_stats = _breadth_pandas(df, last_close)
+    elif engine == 'numpy':
+        daily_stats = _breadth_numpy(df, last_close)
+    else:
+        raise ValueError(f"Unknown breadth engine {engine!r}, expected one of {ENGINES}")
+
+    daily_stats = _add_ursi(daily_stats)
+    return daily_stats.sort_values('date').reset_index(drop=True)[BREADTH_COLUMNS]
+
+
+def _sharded_group_breadth(df, pairs, last_close, engine, executor):
+    """compute_breadth per group, one task per group on `executor`."""
+    stock_names = df['stock'].astype(str)
+    futures = {}
+    for group, members in pairs.groupby('group')['stock']:
+        rows = df[stock_names.isin(members).to_numpy()]
+        if len(rows):
+            futures[group] = executor.submit(compute_breadth, rows, last_close, engine)
+
+    group_stats = []
+    for group, future in futures.items():
+        stats = future.result()
+        stats.insert(0, 'group', group)
+        group_stats.append(stats)
+    return pd.concat(group_stats, ignore_index=True)
+
+
+def compute_group_breadth(df, groups, last_close=None, engine='pandas', executor=None):
+    """Breadth and URSI per group (sector, index basket, exchange...) in one pass.
+
+    Every stock is classified once; the counts are then summed per (group, date).
+    See group_pairs() for the accepted `groups` formats. Stocks without a group
+    are left out. Returns BREADTH_COLUMNS plus a leading `group` column. With an
+    `executor`, each group is computed as a separate task instead.
+    """
+    pairs = group_pairs(groups)
+    if executor is not None:
+        group_stats = _sharded_group_breadth(df, pairs, last_close, engine, executor)
+    elif engine == 'pandas':
+        group_stats = _add_ursi(_group_breadth_pandas(df, pairs, last_close))
+    elif engine == 'numpy':
+        group_stats = _add_ursi(_group_breadth_numpy(df, pairs, last_close))
+    else:
+        raise ValueError(f"Unknown breadth engine {engine!r}, expected one of {ENGINES}")
+
+    group_stats = group_stats.sort_values(['group', 'date']).reset_index(drop=True)
+    return group_stats[['group'] + BREADTH_COLUMNS]
+
+
+def prefix_sums(values):
+    """Running sums of `values` (NaN as 0) and running NaN counts, both with a leading 0.
+
+    The sum over any window [i, j) is prefix[j] - prefix[i]; it is only valid when
+    nan_prefix[j] - nan_prefix[i] is 0. 2-D values are summed along the first
+    (date) axis, one column per stock.
+    """
+    values = np.asarray(values, dtype=float)
+    is_nan = np.isnan(values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    prefix = np.concatenate([zeros, np.cumsum(np.where(is_nan, 0.0, values), axis=0)])
+    nan_prefix = np.concatenate([zeros.astype(np.int64), np.cumsum(is_nan, axis=0)])
+    return prefix, nan_prefix
+
+
+def observed_counts(nan_prefix, period):
+    """Non-NaN values in the trailing `period` rows (fewer at the start) from prefix_sums()."""
+    end = np.arange(1, len(nan_prefix))
+    start = np.maximum(end - period, 0)
+    shape = (-1,) + (1,) * (nan_prefix.ndim - 1)
+    return (end - start).reshape(shape) - (nan_prefix[end] - nan_prefix[start])
+
+
+def moving_average(prefix, nan_prefix, period, min_periods=None):
+    """Simple moving average from prefix_sums(), NaN where the window is incomplete.
+
+    With `min_periods`, NaN values are skipped instead: the mean is taken over
+    the values present in the trailing `period` rows, and is NaN only where
+    fewer than `min_periods` are present, as pandas rolling(min_periods=...).
+    """
+    n = len(prefix) - 1
+    if min_periods is not None:
+        end = np.arange(1, n + 1)
+        start = np.maximum(end - period, 0)
+        counts = observed_counts(nan_prefix, period)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ma = (prefix[end] - prefix[start]) / counts
+        return np.where(counts >= max(min_periods, 1), ma, np.nan)
+
+    ma = np.full((n,) + prefix.shape[1:], np.nan)
+    if period <= n:
+        window = prefix[period:] - prefix[:-period]
+        nans = nan_prefix[period:] - nan_prefix[:-period]
+        ma[period - 1:] = np.where(nans == 0, window / period, np.nan)
+    return ma
+
+
+def rolling_extreme(values, window, func=np.fmax):
+    """Rolling maximum (func=np.fmax) or minimum (np.fmin) over `window` rows of an array.
+
+    Built by doubling: O(log window) vectorised passes over the whole
+    (dates x stocks) grid instead of a loop per stock. NaN cells are skipped, so
+    a window is NaN only when all its values are; the first window - 1 rows
+    cover the rows so far. Use observed_counts() to require enough values.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    out = np.full(values.shape, np.nan)
+    out[:window - 1] = func.accumulate(values[:window - 1], axis=0)
+    if window > n:
+        return out
+    # span[i] = extreme of values[i - size + 1 .. i], for size doubling up to window
+    span, size = values.copy(), 1
+    while size * 2 <= window:
+        span[size * 2 - 1:] = func(span[size * 2 - 1:], span[size - 1:n - size])
+        size *= 2
+    # Two overlapping power-of-two spans cover the window
+    out[window - 1:] = func(span[window - 1:], span[size - 1:n - window + size])
+    return out
+
+
+def compute_breadth_metrics(df, last_close=None, high_low_window=NEW_HIGH_WINDOW, ma_period=STOCK_MA_PERIOD):
+    """URSI plus volume, new high/low and moving-average breadth from one dense pivot.
+
+    `df` holds `stock`, `date`, `close` and optionally `volume`, `high` and `low`
+    (closes stand in for missing high/low). Every per-stock window runs along the
+    date axis of the (dates x stocks) grid, vectorised across stocks, over the
+    market's trading days, and uses the sessions the stock traded in; a window
+    counts when at least MIN_OBSERVED_SHARE of its sessions were traded.
+    Returns BREADTH_COLUMNS plus METRIC_COLUMNS:
+
+    - up_volume / down_volume: volume of advancing / declining stocks, and their ratio
+    - new_highs / new_lows: stocks whose high (low) beats the previous
+      `high_low_window` sessions' highest high (lowest low)
+    - pct_above_ma: percent of stocks closing above their own `ma_period`-day MA
+    """
+    columns = ['close'] + [c for c in ('volume', 'high', 'low') if c in df]
+    values, present, dates, stocks = pivot_values(df, columns)
+    closes = values['close']
+    change, valid = _close_changes(closes, present, stocks, last_close)
+    keep = valid.any(axis=1)
+
+    metrics = pd.DataFrame({
+        'date': dates,
+        'advancing_stocks': (change > 0).sum(axis=1),
+        'declining_stocks': (change < 0).sum(axis=1),
+        'unchanged_stocks': ((change == 0) & valid).sum(axis=1),
+    })
+    metrics = _add_ursi(metrics)
+
+    if 'volume' in values:
+        volume = np.nan_to_num(values['volume'].astype(float))
+        metrics['up_volume'] = np.where(change > 0, volume, 0).sum(axis=1)
+        metrics['down_volume'] = np.where(change < 0, volume, 0).sum(axis=1)
+    else:
+        metrics['up_volume'] = metrics['down_volume'] = np.nan
+    metrics['up_down_volume_ratio'] = metrics['up_volume'] / metrics['down_volume'].replace(0, np.nan)
+
+    # Highest high / lowest low of the previous window, per stock
+    highs = values.get('high', closes)
+    lows = values.get('low', closes)
+    prev_high = np.full(highs.shape, np.nan)
+    prev_low = np.full(lows.shape, np.nan)
+    min_sessions = round(MIN_OBSERVED_SHARE * high_low_window)
+    high_counts = observed_counts(prefix_sums(highs)[1], high_low_window)
+    low_counts = observed_counts(prefix_sums(lows)[1], high_low_window)
+    prev_high[1:] = np.where(high_counts >= min_sessions,
+                             rolling_extreme(highs, high_low_window, np.fmax), np.nan)[:-1]
+    prev_low[1:] = np.where(low_counts >= min_sessions,
+                            rolling_extreme(lows, high_low_window, np.fmin), np.nan)[:-1]
+    metrics['new_highs'] = (highs > prev_high).sum(axis=1)
+    metrics['new_lows'] = (lows < prev_low).sum(axis=1)
+
+    # Each stock's own moving average from column-wise prefix sums
+    ma = moving_average(*prefix_sums(closes), ma_period, min_periods=round(MIN_OBSERVED_SHARE * ma_period))
+    has_ma = ~np.isnan(ma) & present
+    with np.errstate(invalid='ignore', divide='ignore'):
+        metrics['pct_above_ma'] = (closes > ma).sum(axis=1) / has_ma.sum(axis=1) * 100
+
+    return metrics[keep].reset_index(drop=True)[BREADTH_COLUMNS + METRIC_COLUMNS]
+
+
+def _current_matrix(cache_dir):
+    """Directory of the close matrix build published in `cache_dir`, or None."""
+    try:
+        with open(os.path.join(cache_dir, 'current.txt'), encoding='utf-8') as f:
+            build = os.path.join(cache_dir, f.read().strip())
+    except OSError:
+        return None
+    return build if os.path.isdir(build) else None
+
+
+def _published_time(build):
+    """When a complete build was finished (its source.txt written), or None if it isn't."""
+    try:
+        return os.path.getmtime(os.path.join(build, 'source.txt'))
+    except OSError:
+        return None
+
+
+def _close_matrix_key(path):
+    return repr((CACHE_VERSION, os.path.abspath(path), source_signature(path)))
+
+
+def write_close_matrix(path, cache_dir=CLOSE_MATRIX_DIR):
+    """Pivot the whole history of `path` once and save it as .npy files for memory mapping.
+
+    Each writer saves closes and prev_close (dates x stocks, the close dtype),
+    present (bool), the dates, the tickers and the source key into a build
+    directory of its own, then publishes it by atomically replacing
+    `current.txt`. Builds are never modified, so readers and concurrent writers
+    never see a mix of old and new arrays. The build being replaced is kept
+    for readers that resolved it but have not opened it yet; only older ones
+    are removed. Returns the build directory.
+    """
+    df, _ = load_breadth_input(path)
+    closes, present, dates, stocks = pivot_closes(df)
+    arrays = {
+        'closes': closes,
+        'prev_close': _prev_closes(closes, present, stocks),
+        'present': present,
+        'dates': dates.to_numpy(),
+        'stocks': np.asarray(stocks.astype(str), dtype=str),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    build = tempfile.mkdtemp(prefix='build-', dir=cache_dir)
+    for name, values in arrays.items():
+        np.save(os.path.join(build, f'{name}.npy'), values)
+    with open(os.path.join(build, 'source.txt'), 'w', encoding='utf-8') as f:
+        f.write(_close_matrix_key(path))
+
+    previous = _current_matrix(cache_dir)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(build))
+    os.replace(tmp, os.path.join(cache_dir, 'current.txt'))
+
+    # Drop builds finished before the one just replaced. Builds still being
+    # written have no source.txt yet; files still mapped by a reader can't be
+    # removed on Windows, a later rebuild retries.
+    cutoff = _published_time(previous) if previous is not None else None
+    if cutoff is not None:
+        for name in os.listdir(cache_dir):
+            old = os.path.join(cache_dir, name)
+            finished = _published_time(old) if name.startswith('build-') else None
+            if finished is not None and finished < cutoff and old not in (build, previous):
+                shutil.rmtree(old, ignore_errors=True)
+    return build
+
+
+def close_matrix_build(path=None, cache_dir=CLOSE_MATRIX_DIR):
+    """Build directory holding the close matrix of `path`, rebuilt first if the source changed.
+
+    `path` defaults to default_source(). Pass the result to open_close_matrix(),
+    e.g. in pool workers, so every reader maps the same build.
+    """
+    if path is None:
+        path = default_source()
+    build = _current_matrix(cache_dir)
+    if build is not None:
+        try:
+            with open(os.path.join(build, 'source.txt'), encoding='utf-8') as f:
+                if f.read() == _close_matrix_key(path):
+                    return build
+        except OSError:
+            pass
+    return write_close_matrix(path, cache_dir)
+
+
+def open_close_matrix(build):
+    """Open a close matrix build (see close_matrix_build()) without copying it.
+
+    Returns (closes, prev_close, present, dates, stocks); the three grids are
+    read-only np.memmap views, so any number of processes share the same pages.
+    """
+    def grid(name):
+        return np.load(os.path.join(build, f'{name}.npy'), mmap_mode='r')
+
+    dates = np.load(os.path.join(build, 'dates.npy'))
+    stocks = np.load(os.path.join(build, 'stocks.npy'))
+    return grid('closes'), grid('prev_close'), grid('present'), pd.DatetimeIndex(dates), pd.Index(stocks)
+
+
+def load_close_matrix(path=None, cache_dir=CLOSE_MATRIX_DIR):
+    """The memory-mapped close matrix of `path` (see open_close_matrix()), rebuilt if stale."""
+    try:
+        return open_close_matrix(close_matrix_build(path, cache_dir))
+    except FileNotFoundError:
+        # Removed by later rebuilds between resolving and opening it; resolve again
+        return open_close_matrix(close_matrix_build(path, cache_dir))
+
+
+def _matrix_breadth_rows(build, start, stop):
+    """Advancing/declining/unchanged counts for rows [start, stop) of a close matrix build."""
+    closes, prev_close, present, dates, _ = open_close_matrix(build)
+    change, valid = _classify_changes(closes[start:stop], prev_close[start:stop], present[start:stop])
+    return _count_changes(change, valid, dates[start:stop])
+
+
+def matrix_breadth(path=None, cache_dir=CLOSE_MATRIX_DIR, executor=None, n_shards=None):
+    """Daily breadth (BREADTH_COLUMNS) of `path` from its memory-mapped close matrix.
+
+    Previous closes are stored with the matrix, so any block of rows can be
+    classified on its own. With an `executor`, each of `n_shards` row ranges
+    (default: one per CPU) is computed by a worker that maps the same build.
+    """
+    try:
+        return _build_breadth(close_matrix_build(path, cache_dir), executor, n_shards)
+    except FileNotFoundError:
+        # Removed by later rebuilds before every worker opened it; resolve again
+        return _build_breadth(close_matrix_build(path, cache_dir), executor, n_shards)
+
+
+def _build_breadth(build, executor, n_shards):
+    """matrix_breadth() of one close matrix build."""
+    n_dates = len(np.load(os.path.join(build, 'dates.npy'), mmap_mode='r'))
+    if executor is None:
+        daily_stats = _matrix_breadth_rows(build, 0, n_dates)
+    else:
+        bounds = np.linspace(0, n_dates, min(n_shards or os.cpu_count() or 1, max(n_dates, 1)) + 1).astype(int)
+        futures = [executor.submit(_matrix_breadth_rows, build, lo, hi)
+                   for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+        daily_stats = pd.concat([f.result() for f in futures], ignore_index=True)
+    return _add_ursi(daily_stats).reset_index(drop=True)[BREADTH_COLUMNS]
+
+
+def load_breadth(path=None, cache_file=BREADTH_CACHE_FILE, engine='pandas', start=None, end=None):
+    """Return the daily breadth table for `path`, computing it at most once per source version.
+
+    `path` defaults to default_source(). `start`/`end` limit the dates read and
+    computed; the numpy engine classifies the whole history from the
+    memory-mapped close matrix (see load_close_matrix). The result is memoised
+    in-process and pickled to `cache_file`, so running the chart, interactive
+    HTML and Excel scripts back to back computes it only once.
+    """
+    if path is None:
+        path = default_source()
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    signature = source_signature(path)
+    key = (os.path.abspath(path), signature, start, end)
+    if key in _breadth_memo:
+        return _breadth_memo[key].copy()
+
+    daily_stats = None
+    cached = read_cache(cache_file)
+    if isinstance(cached, dict) and cached.get('source') == key:
+        daily_stats = cached['daily_stats']
+
+    if daily_stats is None:
+        if engine == 'numpy' and start is None and end is None:
+            # Whole history: classify the shared memory-mapped matrix
+            daily_stats = matrix_breadth(path)
+        else:
+            df, last_close = load_breadth_input(path, start, end)
+            daily_stats = compute_breadth(df, last_close, engine=engine)
+        if cache_file:
+            write_cache({'source': key, 'daily_stats': daily_stats}, cache_file)
+
+    _breadth_memo[key] = daily_stats
+    return daily_stats.copy()
+
+
+def iter_store_chunks(store_dir=OHLCV_STORE_DIR, chunk_rows=CHUNK_ROWS, columns=BREADTH_INPUT_COLUMNS):
+    """Yield date-ordered frames of at most `chunk_rows` rows from the columnar store."""
+    import pyarrow.parquet as pq
+
+    # year=YYYY partitions sort chronologically; rows inside are date-ordered
+    for year_dir in sorted(os.listdir(store_dir)):
+        year_path = os.path.join(store_dir, year_dir)
+        if not os.path.isdir(year_path):
+            continue
+        for name in sorted(os.listdir(year_path)):
+            parquet_file = pq.ParquetFile(os.path.join(year_path, name))
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=list(columns)):
+                yield batch.to_pandas()
+
+
+def iter_frame_chunks(df, chunk_days=250):
+    """Split an in-memory frame into date-ordered chunks of `chunk_days` trading days."""
+    dates = np.sort(df['date'].unique())
+    for i in range(0, len(dates), chunk_days):
+        window = dates[i:i + chunk_days]
+        yield df[(df['date'] >= window[0]) & (df['date'] <= window[-1])]
+
+
+def iter_breadth(chunks, engine='numpy'):
+    """Yield one breadth row (a dict keyed by BREADTH_COLUMNS) per date from date-ordered chunks.
+
+    Each stock's last close is carried across chunk boundaries, and the rows of a
+    chunk's last date are held back until the next chunk in case that date is split.
+    Memory stays bounded by the chunk size plus one close per stock.
+    """
+    last_close = None
+    carry = None
+
+    def emit(ready):
+        nonlocal last_close
+        daily_stats = compute_breadth(ready, last_close, engine=engine)
+        latest = last_close_by_stock(ready)
+        last_close = latest if last_close is None else latest.combine_first(last_close)
+        for row in daily_stats.itertuples(index=False):
+            yield row._asdict()
+
+    for chunk in chunks:
+        chunk = chunk[BREADTH_INPUT_COLUMNS]
+        if len(chunk) == 0:
+            continue
+        if carry is not None:
+            if chunk['date'].min() < carry['date'].iloc[0]:
+                raise ValueError("Chunks passed to iter_breadth must be in date order")
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        last_date = chunk['date'].max()
+        is_last = (chunk['date'] == last_date).to_numpy()
+        carry = chunk[is_last]
+        if not is_last.all():
+            yield from emit(chunk[~is_last])
+
+    if carry is not None:
+        yield from emit(carry)
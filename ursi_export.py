@@ -0,0 +1,133 @@
+import os
+import numpy as np
+import pandas as pd
+
+from ursi_stats import UrsiStats
+
+# Output formats of export_sheets(): one workbook, or one file per sheet when
+# the workbook isn't needed
+EXPORT_FORMATS = ('xlsx', 'parquet', 'csv')
+
+DATE_FORMAT = 'yyyy-mm-dd'
+
+
+def summary_table(stats):
+    """Summary sheet from a UrsiStats: date range, URSI distribution, zone counts and the latest day."""
+    return pd.DataFrame({
+        'Metric': [
+            'Start Date',
+            'End Date',
+            'Total Trading Days',
+            'Average URSI',
+            'Median URSI',
+            'Min URSI',
+            'Max URSI',
+            'Standard Deviation',
+            'Days Above 70 (Overbought)',
+            'Days Below 30 (Oversold)',
+            'Days in Neutral Zone (30-70)',
+            'Current URSI',
+            'Current Advancing Stocks',
+            'Current Declining Stocks',
+            'Current Unchanged Stocks'
+        ],
+        'Value': [
+            stats.first_date.strftime('%Y-%m-%d'),
+            stats.last_date.strftime('%Y-%m-%d'),
+            stats.days,
+            f"{stats.mean:.2f}",
+            f"{stats.median:.2f}",
+            f"{stats.min:.2f}",
+            f"{stats.max:.2f}",
+            f"{stats.std:.2f}",
+            stats.above,
+            stats.below,
+            stats.neutral,
+            f"{stats.latest['URSI']:.2f}",
+            stats.latest['advancing_stocks'],
+            stats.latest['declining_stocks'],
+            stats.latest['unchanged_stocks']
+        ]
+    })
+
+
+def build_sheets(daily_stats, stats=None):
+    """The ursi_analysis sheet set, all derived from one breadth table (e.g. load_breadth()).
+
+    `stats` is the table's UrsiStats (e.g. from load_stats()); it is computed
+    here when not given.
+    """
+    if stats is None:
+        stats = UrsiStats().update(daily_stats)
+    return {
+        'URSI_Daily': daily_stats,
+        'Summary': summary_table(stats),
+        'Monthly_Averages': stats.monthly(),
+    }
+
+
+def _cell_columns(frame):
+    """Each column as a list of plain Python values, NaN/NaT as None."""
+    columns = []
+    for name in frame.columns:
+        values = frame[name]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            cells = [None if pd.isna(v) else v for v in values.dt.to_pydatetime()]
+        else:
+            cells = [None if v is None or (isinstance(v, float) and v != v)
+                     else v.item() if isinstance(v, np.generic) else v
+                     for v in values.astype(object)]
+        columns.append(cells)
+    return columns
+
+
+def write_excel(sheets, path):
+    """Write `sheets` (name -> frame) with xlsxwriter in constant_memory mode.
+
+    Rows are streamed to disk in order instead of building every cell in memory
+    as openpyxl does, which is much faster and gives a smaller workbook.
+    """
+    import xlsxwriter
+
+    with xlsxwriter.Workbook(path, {'constant_memory': True}) as workbook:
+        header = workbook.add_format({'bold': True, 'border': 1})
+        date = workbook.add_format({'num_format': DATE_FORMAT})
+        for name, frame in sheets.items():
+            worksheet = workbook.add_worksheet(name)
+            worksheet.write_row(0, 0, [str(c) for c in frame.columns], header)
+            date_columns = [i for i, c in enumerate(frame.columns)
+                            if pd.api.types.is_datetime64_any_dtype(frame[c])]
+            for i in date_columns:
+                worksheet.set_column(i, i, 11)
+            # constant_memory needs each row written completely before the next
+            for row, cells in enumerate(zip(*_cell_columns(frame)), start=1):
+                worksheet.write_row(row, 0, cells)
+                for i in date_columns:
+                    if cells[i] is not None:
+                        worksheet.write_datetime(row, i, cells[i], date)
+
+
+def export_sheets(sheets, path, fmt='xlsx'):
+    """Write `sheets` to `path` in `fmt`; returns the files written.
+
+    'xlsx' writes one workbook. 'parquet' and 'csv' write one file per sheet
+    next to `path`, named <stem>_<sheet>.<fmt>.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"fmt must be one of {EXPORT_FORMATS}, got {fmt!r}")
+    if fmt == 'xlsx':
+        write_excel(sheets, path)
+        return [path]
+
+    stem = os.path.splitext(path)[0]
+    files = []
+    for name, frame in sheets.items():
+        file = f"{stem}_{name}.{fmt}"
+        if fmt == 'parquet':
+            # Mixed-type columns (the Summary values) are stored as text
+            mixed = [c for c in frame.columns if frame[c].dtype == object]
+            frame.astype({c: str for c in mixed}).to_parquet(file, index=False)
+        else:
+            frame.to_csv(file, index=False)
+        files.append(file)
+    return files
@@ -0,0 +1,346 @@
+import base64
+import json
+import os
+import numpy as np
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+from ursi_core import prefix_sums
+
+# Ways embed_data() can put the URSI series into a page
+EMBED_MODES = ('json', 'binary')
+
+# How pages load plotly.js:
+#   'directory' - one shared copy next to the pages (offline, cached across pages)
+#   'inline'    - embedded in every page (single self-contained file)
+#   'cdn'       - from cdn.plot.ly, pinned to the version the plotly package ships
+PLOTLY_JS_MODES = ('directory', 'inline', 'cdn')
+PLOTLY_JS_MODE = 'directory'
+
+# Optional plotly.js build to use instead of the one in the plotly package,
+# e.g. a downloaded partial bundle such as plotly-basic.min.js
+PLOTLY_BUNDLE_FILE = None
+
+PLOTLY_JS_FILE = 'plotly.min.js'
+
+# Level-of-detail downsampling for long series (binary embedding only): the
+# zoomed-out view draws at most LOD_POINTS points picked by LOD_METHODS, and a
+# zoomed window of LOD_POINTS days or fewer is drawn at full resolution
+LOD_METHODS = ('lttb', 'minmax')
+LOD_POINTS = 2000
+
+# Client-side moving average over the prefix sums emitted by ma_payload():
+# each point is one subtraction, so any period costs O(n) instead of O(n x period)
+MA_JS = """        // Moving average from prefix sums: O(1) per point for any period
+        function calculateMA(data, period) {
+            const prefix = data.prefix;
+            const nanPrefix = data.nan_prefix;
+            const n = prefix.length - 1;
+            const ma = new Array(n).fill(null);
+            for (let i = period - 1; i < n; i++) {
+                // Windows containing a missing URSI value stay empty
+                if (nanPrefix[i + 1] - nanPrefix[i + 1 - period] === 0) {
+                    ma[i] = (prefix[i + 1] - prefix[i + 1 - period]) / period;
+                }
+            }
+            return ma;
+        }
+"""
+
+
+def ma_payload(daily_stats):
+    """URSI data for the page: dates plus prefix sums that MA_JS turns into any MA."""
+    prefix, nan_prefix = prefix_sums(daily_stats['URSI'])
+    return {
+        'dates': daily_stats['date'].dt.strftime('%Y-%m-%d').tolist(),
+        'prefix': prefix.tolist(),
+        'nan_prefix': nan_prefix.tolist()
+    }
+
+
+# Level-of-detail helpers shared by the interactive pages. Without an embedded
+# `lod` index list every function is a no-op and all points are drawn.
+LOD_JS = """        // Visible date range, null when zoomed out
+        let lodRange = null;
+
+        // First index whose date is >= day (dates are sorted YYYY-MM-DD strings)
+        function dateIndex(dates, day) {
+            let lo = 0, hi = dates.length;
+            while (lo < hi) {
+                const mid = (lo + hi) >> 1;
+                if (dates[mid] < day) lo = mid + 1; else hi = mid;
+            }
+            return lo;
+        }
+
+        // Points to draw: the downsampled overview, with the visible window at
+        // full resolution once it is small enough (null means every point)
+        function lodIndices(data) {
+            if (!data.lod) return null;
+            if (!lodRange) return data.lod;
+            const n = data.dates.length;
+            const lo = Math.max(dateIndex(data.dates, String(lodRange[0]).slice(0, 10)) - 1, 0);
+            const hi = Math.min(dateIndex(data.dates, String(lodRange[1]).slice(0, 10)) + 1, n);
+            if (hi - lo > data.lod_points) return data.lod;
+            const idx = data.lod.filter(i => i < lo);
+            for (let i = lo; i < hi; i++) idx.push(i);
+            data.lod.forEach(i => { if (i >= hi) idx.push(i); });
+            return idx;
+        }
+
+        function pick(values, idx) {
+            return idx === null ? values : idx.map(i => values[i]);
+        }
+
+        // Redraw the URSI, MA and indicator traces for the current zoom
+        function redrawLOD(divId, data) {
+            const idx = lodIndices(data);
+            const x = pick(data.dates, idx);
+            Plotly.restyle(divId, {x: [x], y: [pick(data.values, idx)], customdata: [pick(data.customdata, idx)]},
+                           [data.traces[0]]);
+            if (data.ma) {
+                Plotly.restyle(divId, {x: [x.map(d => new Date(d))], y: [pick(data.ma, idx)]}, [data.traces[1]]);
+            }
+            if (data.series && data.series.length) {
+                Plotly.restyle(divId, {x: data.series.map(() => x), y: data.series.map(s => pick(s.values, idx))},
+                               data.series.map(s => s.trace));
+            }
+        }
+
+        // Track zoom, range-slider and reset events
+        function enableLOD(divId, data) {
+            if (!data.lod) return;
+            document.getElementById(divId).on('plotly_relayout', function(event) {
+                if (event['xaxis.autorange']) {
+                    lodRange = null;
+                } else if (event['xaxis.range']) {
+                    lodRange = event['xaxis.range'];
+                } else if (event['xaxis.range[0]'] !== undefined) {
+                    lodRange = [event['xaxis.range[0]'], event['xaxis.range[1]']];
+                } else {
+                    return;
+                }
+                redrawLOD(divId, data);
+            });
+        }
+"""
+
+
+# Decoder for embed_data(mode='binary'): rebuilds the dates, URSI values, hover
+# counts, MA prefix sums and indicator series from base64 typed arrays, then
+# fills the figure traces
+BINARY_JS = """        // Decode a base64 little-endian typed array
+        function decodeArray(b64, ArrayType) {
+            const bin = atob(b64);
+            const bytes = new Uint8Array(bin.length);
+            for (let i = 0; i < bin.length; i++) {
+                bytes[i] = bin.charCodeAt(i);
+            }
+            return new ArrayType(bytes.buffer);
+        }
+
+        // Dates, URSI, hover counts and MA prefix sums from the binary payload
+        function decodeUrsiData(payload) {
+            const days = decodeArray(payload.days, Int32Array);
+            const values = decodeArray(payload.ursi, Float32Array);
+            const counts = payload.counts.map(c => decodeArray(c, Uint16Array));
+            const n = values.length;
+            const dates = new Array(n);
+            const customdata = new Array(n);
+            const prefix = new Float64Array(n + 1);
+            const nanPrefix = new Int32Array(n + 1);
+            for (let i = 0; i < n; i++) {
+                dates[i] = new Date(days[i] * 86400000).toISOString().slice(0, 10);
+                customdata[i] = counts.map(c => c[i]);
+                const missing = isNaN(values[i]);
+                prefix[i + 1] = prefix[i] + (missing ? 0 : values[i]);
+                nanPrefix[i + 1] = nanPrefix[i] + (missing ? 1 : 0);
+            }
+            const lod = payload.lod ? Array.from(decodeArray(payload.lod, Int32Array)) : null;
+            const series = (payload.series || []).map(([trace, b64]) => ({trace: trace, values: decodeArray(b64, Float32Array)}));
+            return {dates: dates, values: values, customdata: customdata, prefix: prefix, nan_prefix: nanPrefix,
+                    lod: lod, lod_points: payload.lod_points, traces: payload.filled_traces, series: series, ma: null};
+        }
+
+        // The first stripped trace gets the URSI series, indicator traces their own
+        // series and the others empty placeholders
+        function fillFigure(figure, data, payload) {
+            const idx = lodIndices(data);
+            const x = pick(data.dates, idx);
+            payload.filled_traces.forEach((traceIndex, i) => {
+                const trace = figure.data[traceIndex];
+                const series = data.series.find(s => s.trace === traceIndex);
+                trace.x = x;
+                if (i === 0) {
+                    trace.y = pick(data.values, idx);
+                    trace.customdata = pick(data.customdata, idx);
+                } else if (series) {
+                    trace.y = pick(series.values, idx);
+                } else {
+                    trace.y = new Array(x.length).fill(null);
+                }
+            });
+        }
+"""
+
+
+def _b64(values, dtype):
+    """Base64 of `values` packed as a little-endian `dtype` array."""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+def binary_payload(daily_stats, customdata_columns):
+    """Series packed once as int32 day offsets, float32 URSI and uint16 counts."""
+    days = daily_stats['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    return {
+        'days': _b64(days, '<i4'),
+        'ursi': _b64(daily_stats['URSI'], '<f4'),
+        'counts': [_b64(daily_stats[col], '<u2') for col in customdata_columns]
+    }
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of `n_out` points that keep the line's shape."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    y = np.where(np.isnan(y), np.nanmean(y), y)
+
+    # First and last points are kept; the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = [0]
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        next_hi = edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        # Pick the point forming the largest triangle with the previous pick and the next bucket's mean
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        indices.append(a)
+    indices.append(n - 1)
+    return np.array(indices)
+
+
+def minmax_indices(y, n_out):
+    """Indices of the minimum and maximum of each of n_out // 2 buckets, plus both ends."""
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    y = np.where(np.isnan(y), np.nanmean(y), y)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(int)
+    indices = [0, n - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        indices += [lo + int(np.argmin(y[lo:hi])), lo + int(np.argmax(y[lo:hi]))]
+    return np.unique(indices)
+
+
+def downsample_indices(daily_stats, method='lttb', n_out=LOD_POINTS):
+    """Indices of the URSI points drawn in the zoomed-out view."""
+    if method == 'lttb':
+        days = daily_stats['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        return lttb_indices(days, daily_stats['URSI'], n_out)
+    if method == 'minmax':
+        return minmax_indices(daily_stats['URSI'], n_out)
+    raise ValueError(f"Unknown downsampling method {method!r}, expected one of {LOD_METHODS}")
+
+
+def embed_data(fig, daily_stats, customdata_columns, mode='json', lod=None):
+    """JavaScript defining `figureData` and `ursiData` for the interactive pages.
+
+    'json' embeds the full Plotly figure plus the prefix sums from ma_payload().
+    'binary' strips the per-day arrays from the figure and embeds the series once
+    as base64 typed arrays, decoded in the browser into both the Plotly traces
+    (URSI with `customdata_columns` as hover counts, plus any other full-length
+    trace with values, e.g. indicators) and the MA prefix sums.
+    `lod` ('lttb' or 'minmax', binary mode only) draws series longer than
+    LOD_POINTS downsampled until the view is zoomed in (see LOD_JS).
+    """
+    if mode == 'json':
+        if lod:
+            raise ValueError("Level-of-detail downsampling needs the 'binary' embed mode")
+        return (LOD_JS +
+                f"        const figureData = {fig.to_json()};\n"
+                f"        const ursiData = {json.dumps(ma_payload(daily_stats))};\n")
+    if mode != 'binary':
+        raise ValueError(f"Unknown embed mode {mode!r}, expected one of {EMBED_MODES}")
+
+    # Drop the per-day arrays from every trace drawn over the full date axis;
+    # other traces with data (indicators) keep their values as float32 series
+    stripped = go.Figure(fig)
+    filled_traces = []
+    series = []
+    for i, trace in enumerate(stripped.data):
+        if trace.x is not None and len(trace.x) == len(daily_stats):
+            if filled_traces and trace.y is not None:
+                values = np.array(trace.y, dtype=float)
+                if not np.isnan(values).all():
+                    series.append([i, _b64(values, '<f4')])
+            trace.x = None
+            trace.y = None
+            trace.customdata = None
+            filled_traces.append(i)
+
+    payload = binary_payload(daily_stats, customdata_columns)
+    payload['filled_traces'] = filled_traces
+    payload['series'] = series
+    if lod and len(daily_stats) > LOD_POINTS:
+        payload['lod'] = _b64(downsample_indices(daily_stats, lod), '<i4')
+        payload['lod_points'] = LOD_POINTS
+    return (LOD_JS + BINARY_JS +
+            f"        const figureData = {stripped.to_json()};\n"
+            f"        const ursiPayload = {json.dumps(payload)};\n"
+            f"        const ursiData = decodeUrsiData(ursiPayload);\n"
+            f"        fillFigure(figureData, ursiData, ursiPayload);\n")
+
+
+def plotly_bundle(bundle_file=None):
+    """plotly.js source: `bundle_file` if given, else the build pinned by the plotly package."""
+    if bundle_file:
+        with open(bundle_file, encoding='utf-8') as f:
+            return f.read()
+    return get_plotlyjs()
+
+
+def plotly_script_tag(output_file, mode=None, bundle_file=None):
+    """<script> tag that loads plotly.js for a page written to `output_file`.
+
+    `mode` and `bundle_file` default to PLOTLY_JS_MODE and PLOTLY_BUNDLE_FILE. In
+    'directory' mode the bundle is written next to the page once and reused by
+    every other page in that directory.
+    """
+    mode = mode or PLOTLY_JS_MODE
+    bundle_file = bundle_file or PLOTLY_BUNDLE_FILE
+    if mode == 'cdn':
+        if bundle_file:
+            raise ValueError("A local plotly.js bundle cannot be loaded in 'cdn' mode")
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+    if mode == 'inline':
+        return f'<script type="text/javascript">{plotly_bundle(bundle_file)}</script>'
+    if mode != 'directory':
+        raise ValueError(f"Unknown plotly.js mode {mode!r}, expected one of {PLOTLY_JS_MODES}")
+
+    name = os.path.basename(bundle_file) if bundle_file else PLOTLY_JS_FILE
+    target = os.path.join(os.path.dirname(os.path.abspath(output_file)), name)
+    bundle = plotly_bundle(bundle_file)
+    # Only rewrite the shared copy when it changed, so browsers keep their cached one
+    current = None
+    if os.path.exists(target):
+        with open(target, encoding='utf-8') as f:
+            current = f.read()
+    if current != bundle:
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(bundle)
+    return f'<script src="{name}"></script>'
+
+
+def write_figure_html(fig, output_file, mode=None, bundle_file=None):
+    """fig.write_html() equivalent that loads plotly.js like the interactive pages."""
+    html = fig.to_html(include_plotlyjs=False, full_html=True)
+    html = html.replace('<head>', '<head>\n    ' + plotly_script_tag(output_file, mode, bundle_file), 1)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(html)
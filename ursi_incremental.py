@@ -0,0 +1,92 @@
+import os
+import pandas as pd
+
+from ursi_core import DATA_DIR, compute_breadth, default_source, last_rows_by_stock, load_breadth_input
+
+# Persisted state, kept apart from the ursi_data.csv the chart scripts rewrite
+STATS_FILE = os.path.join(DATA_DIR, 'ursi_incremental.csv')
+LAST_CLOSE_FILE = os.path.join(DATA_DIR, 'ursi_last_close.csv')
+
+# Same columns as the ursi_data.csv written by calculate_ursi_interactive.py
+STATS_COLUMNS = ['date', 'advancing_stocks', 'declining_stocks', 'total_stocks', 'URSI']
+LAST_CLOSE_COLUMNS = ['stock', 'date', 'close']
+
+
+def load_state(stats_file=STATS_FILE, last_close_file=LAST_CLOSE_FILE):
+    """Return (daily_stats, last_close), or (None, None) if there is no usable state.
+
+    The state is only usable when both files have the expected columns and the
+    last closes were saved with the last computed day, i.e. neither file was
+    rewritten or extended without the other.
+    """
+    # Both files are needed: daily stats without last closes cannot be extended
+    if not (os.path.exists(stats_file) and os.path.exists(last_close_file)):
+        return None, None
+    daily_stats = pd.read_csv(stats_file, parse_dates=['date'])
+    last_close = pd.read_csv(last_close_file, parse_dates=['date'], dtype={'stock': str})
+    if list(daily_stats.columns) != STATS_COLUMNS or list(last_close.columns) != LAST_CLOSE_COLUMNS:
+        return None, None
+    if len(daily_stats) == 0 or last_close['date'].max() != daily_stats['date'].max():
+        return None, None
+    return daily_stats, last_close
+
+
+def compute_new_days(df, last_close=None, after=None):
+    """Compute daily stats for rows dated after `after`, seeding prev_close from `last_close`."""
+    # Keep only rows newer than the last computed date
+    if after is not None:
+        df = df[df['date'] > after]
+
+    seed = None
+    if last_close is not None and len(last_close) > 0:
+        seed = last_close.set_index('stock')['close']
+    daily_stats = compute_breadth(df, last_close=seed)[STATS_COLUMNS]
+
+    # Latest close per stock, carried forward to the next update
+    if last_close is not None and len(last_close) > 0:
+        df = pd.concat([last_close[LAST_CLOSE_COLUMNS], df[LAST_CLOSE_COLUMNS]], ignore_index=True)
+    new_last_close = last_rows_by_stock(df)[LAST_CLOSE_COLUMNS]
+
+    return daily_stats, new_last_close
+
+
+def update_ursi(df, stats_file=STATS_FILE, last_close_file=LAST_CLOSE_FILE):
+    """Append trading days newer than the persisted state; returns (daily_stats, new_days).
+
+    Only rows dated after the last computed day are processed. Rows back-filled for
+    days already in the state are ignored; delete the state files to rebuild from scratch.
+    Without a usable state (see load_state) `df` must hold the whole history.
+    """
+    daily_stats, last_close = load_state(stats_file, last_close_file)
+
+    if daily_stats is None:
+        # No state yet: full computation over the whole history
+        new_days, last_close = compute_new_days(df)
+        new_days.to_csv(stats_file, index=False)
+        last_close.to_csv(last_close_file, index=False)
+        return new_days, new_days
+
+    new_days, last_close = compute_new_days(df, last_close, after=daily_stats['date'].max())
+    if len(new_days) > 0:
+        # Append only the new rows instead of rewriting the whole table
+        new_days.to_csv(stats_file, mode='a', header=False, index=False)
+        last_close.to_csv(last_close_file, index=False)
+        daily_stats = pd.concat([daily_stats, new_days], ignore_index=True)
+    return daily_stats, new_days
+
+
+if __name__ == '__main__':
+    # Read only the days after the saved state, or everything when rebuilding
+    daily_stats, _ = load_state()
+    start = daily_stats['date'].max() + pd.Timedelta(days=1) if daily_stats is not None else None
+    # The seed comes from the saved last closes, so skip looking it up in the source
+    df, _ = load_breadth_input(default_source(), start=start, seed=False)
+
+    daily_stats, new_days = update_ursi(df)
+
+    print(f"URSI incremental update complete!")
+    print(f"New trading days processed: {len(new_days)}")
+    print(f"Date range: {daily_stats['date'].min()} to {daily_stats['date'].max()}")
+    print(f"Current URSI (latest): {daily_stats['URSI'].iloc[-1]:.2f}")
+    print(f"\nURSI data updated in: {STATS_FILE}")
+    print(f"Last closes saved to: {LAST_CLOSE_FILE}")
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+from ursi_core import moving_average, prefix_sums
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Indicator specs are tuples of a kind and its parameters:
+#   ('sma', period)                   MA_<period>
+#   ('ema', period)                   EMA_<period>
+#   ('std', period)                   STD_<period>, rolling sample standard deviation
+#   ('bollinger', period, width)      BB_Mid/BB_Upper/BB_Lower_<period>, MA -/+ width x STD
+#   ('mcclellan', fast, slow)         McClellan_Osc (EMA fast - EMA slow of advancing -
+#                                     declining) and McClellan_Sum, its running total
+#   ('ad_line',)                      AD_Line, cumulative advancing - declining
+# URSI indicators are computed on the URSI column, the others on the stock counts.
+INDICATOR_KINDS = ('sma', 'ema', 'std', 'bollinger', 'mcclellan', 'ad_line')
+
+# Default suite for generate_ursi_with_ma.py
+INDICATORS = [
+    ('sma', 5), ('sma', 10), ('sma', 20), ('sma', 50),
+    ('ema', 20),
+    ('bollinger', 20, 2),
+    ('mcclellan', 19, 39),
+    ('ad_line',),
+]
+
+
+def _ema_loop(values, alphas, out):
+    """Exponential averages of every column of `values` in one pass over the rows.
+
+    Seeded with each column's first value; NaN inputs hold the previous average.
+    """
+    n, k = values.shape
+    for j in range(k):
+        out[0, j] = values[0, j]
+    for i in range(1, n):
+        for j in range(k):
+            x = values[i, j]
+            prev = out[i - 1, j]
+            if x != x:
+                out[i, j] = prev
+            elif prev != prev:
+                out[i, j] = x
+            else:
+                out[i, j] = prev + alphas[j] * (x - prev)
+
+
+# Compiled with numba when it is installed
+_ema = njit(cache=True)(_ema_loop) if njit is not None else _ema_loop
+
+
+def indicator_columns(spec):
+    """Output column names of one indicator spec."""
+    kind = spec[0]
+    if kind == 'sma':
+        return [f'MA_{spec[1]}']
+    if kind == 'ema':
+        return [f'EMA_{spec[1]}']
+    if kind == 'std':
+        return [f'STD_{spec[1]}']
+    if kind == 'bollinger':
+        return [f'BB_Mid_{spec[1]}', f'BB_Upper_{spec[1]}', f'BB_Lower_{spec[1]}']
+    if kind == 'mcclellan':
+        return ['McClellan_Osc', 'McClellan_Sum']
+    if kind == 'ad_line':
+        return ['AD_Line']
+    raise ValueError(f"Unknown indicator {kind!r}, expected one of {INDICATOR_KINDS}")
+
+
+def compute_indicators(daily_stats, specs=INDICATORS):
+    """All indicators in `specs` over a daily breadth table, as a frame aligned with it.
+
+    The rolling windows share one set of prefix sums (of URSI and URSI squared),
+    so every window is O(1) per day whatever the period, and all exponential
+    averages, URSI EMAs and the McClellan legs alike, are advanced together in a
+    single pass over the days.
+    """
+    for spec in specs:
+        indicator_columns(spec)
+    ursi = daily_stats['URSI'].to_numpy(dtype=float)
+    net = (daily_stats['advancing_stocks'] - daily_stats['declining_stocks']).to_numpy(dtype=float)
+    n = len(ursi)
+
+    # Shared rolling sums
+    prefix, nan_prefix = prefix_sums(ursi)
+    prefix_sq = prefix_sums(ursi ** 2)[0]
+    means, stds = {}, {}
+
+    def sma(period):
+        if period not in means:
+            means[period] = moving_average(prefix, nan_prefix, period)
+        return means[period]
+
+    def std(period):
+        if period not in stds:
+            mean_sq = moving_average(prefix_sq, nan_prefix, period)
+            var = (mean_sq - sma(period) ** 2) * period / (period - 1) if period > 1 else np.full(n, np.nan)
+            stds[period] = np.sqrt(np.clip(var, 0, None))
+        return stds[period]
+
+    # Every exponential average, stacked as columns for one pass
+    ema_inputs, ema_periods = [], []
+    for spec in specs:
+        if spec[0] == 'ema':
+            ema_inputs.append(ursi)
+            ema_periods.append(spec[1])
+        elif spec[0] == 'mcclellan':
+            ema_inputs += [net, net]
+            ema_periods += [spec[1], spec[2]]
+    emas = np.empty((n, len(ema_periods)))
+    if n and ema_periods:
+        alphas = 2.0 / (np.array(ema_periods, dtype=float) + 1)
+        _ema(np.column_stack(ema_inputs), alphas, emas)
+
+    columns = {}
+    e = 0
+    for spec in specs:
+        kind = spec[0]
+        if kind == 'sma':
+            columns[f'MA_{spec[1]}'] = sma(spec[1])
+        elif kind == 'ema':
+            columns[f'EMA_{spec[1]}'] = emas[:, e]
+            e += 1
+        elif kind == 'std':
+            columns[f'STD_{spec[1]}'] = std(spec[1])
+        elif kind == 'bollinger':
+            period, width = spec[1], spec[2]
+            columns[f'BB_Mid_{period}'] = sma(period)
+            columns[f'BB_Upper_{period}'] = sma(period) + width * std(period)
+            columns[f'BB_Lower_{period}'] = sma(period) - width * std(period)
+        elif kind == 'mcclellan':
+            oscillator = emas[:, e] - emas[:, e + 1]
+            e += 2
+            columns['McClellan_Osc'] = oscillator
+            columns['McClellan_Sum'] = np.cumsum(oscillator)
+        else:
+            columns['AD_Line'] = np.cumsum(net)
+    return pd.DataFrame(columns, index=daily_stats.index)
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import csv
+import os
+import numpy as np
+import pandas as pd
+
+from ursi_core import DATA_DIR, default_source, last_close_by_stock, load_breadth_input
+
+# Local tick file replayed by default: CSV with time, stock, price columns
+TICKS_FILE = os.path.join(DATA_DIR, 'ursi_ticks.csv')
+
+# Seconds of feed time between URSI snapshots
+SNAPSHOT_INTERVAL = 60
+
+
+class BreadthTracker:
+    """Intraday advancing/declining/unchanged counts against each stock's reference close.
+
+    Every tick moves at most one stock between states, so an update is O(1) and a
+    snapshot never rescans the universe. Prices are compared as float32, like the
+    compact closes the end-of-day engine uses, so a tick equal to the reference
+    close counts as unchanged whatever precision the feed uses.
+    """
+
+    def __init__(self, reference):
+        # Reference (prior) close per stock; stocks without one are not counted
+        self.reference = {stock: float(np.float32(close)) for stock, close in dict(reference).items()}
+        self.last_price = {}
+        self.state = {}
+        self.counts = {1: 0, -1: 0, 0: 0}
+
+    def update(self, stock, price):
+        """Record the latest traded price of `stock`."""
+        ref = self.reference.get(stock)
+        price = float(np.float32(price))
+        if ref is None or price != price:
+            return
+        self.last_price[stock] = price
+        new = (price > ref) - (price < ref)
+        old = self.state.get(stock)
+        if old == new:
+            return
+        if old is not None:
+            self.counts[old] -= 1
+        self.counts[new] += 1
+        self.state[stock] = new
+
+    def snapshot(self, time=None):
+        """Current counts and URSI, in the ursi_data.csv column layout."""
+        advancing, declining, unchanged = self.counts[1], self.counts[-1], self.counts[0]
+        moving = advancing + declining
+        return {
+            'date': time,
+            'advancing_stocks': advancing,
+            'declining_stocks': declining,
+            'unchanged_stocks': unchanged,
+            'URSI': advancing / moving * 100 if moving else float('nan'),
+            'total_stocks': advancing + declining + unchanged,
+        }
+
+    def roll(self):
+        """Start a new session: today's last prices become the reference closes."""
+        self.reference.update(self.last_price)
+        self.last_price = {}
+        self.state = {}
+        self.counts = {1: 0, -1: 0, 0: 0}
+
+
+async def replay_ticks(path=TICKS_FILE, speed=None):
+    """Async source of (time, stock, price) ticks read from a local CSV file.
+
+    With `speed` the replay sleeps for the gap between tick times divided by
+    `speed` (1 = real time); without it ticks are produced as fast as possible.
+    """
+    previous = None
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            time = pd.Timestamp(row['time'])
+            if speed and previous is not None and time > previous:
+                await asyncio.sleep((time - previous).total_seconds() / speed)
+            previous = time
+            yield time, row['stock'], float(row['price'])
+            # Let other tasks (e.g. a dashboard server) run between ticks
+            await asyncio.sleep(0)
+
+
+async def stream_ursi(ticks, tracker, interval=SNAPSHOT_INTERVAL):
+    """Feed `ticks` into `tracker` and yield a snapshot every `interval` seconds of feed time.
+
+    A final snapshot is emitted when each session (calendar date of the ticks)
+    ends. The tracker then rolls, so the next session is measured against the
+    previous one's last prices, and the snapshot clock restarts at its first
+    tick instead of filling the overnight gap.
+    """
+    step = pd.Timedelta(seconds=interval)
+    next_snapshot = None
+    session = None
+    last_time = None
+    async for time, stock, price in ticks:
+        if session is not None and time.normalize() > session:
+            yield tracker.snapshot(last_time)
+            tracker.roll()
+            next_snapshot = None
+        session = time.normalize()
+        if next_snapshot is None:
+            next_snapshot = time.floor(step) + step
+        # Emit every interval boundary this tick has moved past
+        while time >= next_snapshot:
+            yield tracker.snapshot(next_snapshot)
+            next_snapshot += step
+        tracker.update(stock, price)
+        last_time = time
+    if last_time is not None:
+        yield tracker.snapshot(last_time)
+
+
+def reference_closes(before=None, path=None):
+    """Each stock's last end-of-day close (before `before`, if given) as the intraday reference."""
+    df, last_close = load_breadth_input(path or default_source(), end=before)
+    if before is not None:
+        df = df[df['date'] < pd.Timestamp(before)]
+    return last_close_by_stock(df)
+
+
+async def _print_snapshots(args):
+    tracker = BreadthTracker(reference_closes(args.session))
+    async for snap in stream_ursi(replay_ticks(args.ticks, args.speed), tracker, args.interval):
+        print(f"{snap['date']}  URSI {snap['URSI']:6.2f}  "
+              f"Adv {snap['advancing_stocks']:4d}  Dec {snap['declining_stocks']:4d}  "
+              f"Unch {snap['unchanged_stocks']:4d}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a tick file through the intraday URSI engine')
+    parser.add_argument('--ticks', default=TICKS_FILE)
+    parser.add_argument('--session', help='session date; reference closes are taken from before it')
+    parser.add_argument('--interval', type=float, default=SNAPSHOT_INTERVAL, help='seconds between snapshots')
+    parser.add_argument('--speed', type=float, help='replay speed (1 = real time, default: no delay)')
+    asyncio.run(_print_snapshots(parser.parse_args()))
@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import re
+import traceback
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+
+from ursi_api import GROUPS_FILE, QueryError, UrsiQuery
+from ursi_core import load_breadth
+from ursi_realtime import SNAPSHOT_INTERVAL, BreadthTracker, reference_closes, replay_ticks, stream_ursi
+
+# Dashboard served by default (written by generate_ursi_with_ma.py)
+PAGE_FILE = r"C:\Users\minhdang\OneDrive - DRAGON CAPITAL\CodeVisual\Tai_Training\ursi_interactive_ma.html"
+
+# Hover counts of the URSI trace, in the order the page's customdata uses
+CUSTOMDATA_COLUMNS = ['advancing_stocks', 'declining_stocks', 'unchanged_stocks', 'total_stocks']
+
+HOST = '127.0.0.1'
+PORT = 8050
+
+# Seconds between checks of the end-of-day data for new trading days
+POLL_INTERVAL = 60
+
+# Appended to the served page: applies each pushed point to ursiData and the chart.
+# A new day is appended with Plotly.extendTraces; a later snapshot of the same day
+# (intraday) replaces the last point in place. Needs the 'binary' page embedding.
+LIVE_JS = """
+<script>
+    (function() {
+        const divId = 'plotDiv';
+        // Typed arrays from the binary payload cannot grow
+        ['values', 'prefix', 'nan_prefix'].forEach(k => { ursiData[k] = Array.from(ursiData[k]); });
+
+        function maAt(i) {
+            const p = ursiData.maPeriod;
+            if (i < p - 1 || ursiData.nan_prefix[i + 1] - ursiData.nan_prefix[i + 1 - p] > 0) return null;
+            return (ursiData.prefix[i + 1] - ursiData.prefix[i + 1 - p]) / p;
+        }
+
+        function applyPoint(point) {
+            const value = point.URSI === null ? NaN : point.URSI;
+            const customdata = CUSTOMDATA_COLUMNS.map(c => point[c]);
+            let n = ursiData.dates.length;
+            const sameDay = n > 0 && ursiData.dates[n - 1] === point.date;
+            if (!sameDay) {
+                ursiData.dates.push(point.date);
+                ursiData.values.push(value);
+                ursiData.customdata.push(customdata);
+                ursiData.prefix.push(0);
+                ursiData.nan_prefix.push(0);
+                if (ursiData.lod) ursiData.lod.push(n);
+                n += 1;
+            } else {
+                ursiData.values[n - 1] = value;
+                ursiData.customdata[n - 1] = customdata;
+            }
+            const missing = isNaN(value);
+            ursiData.prefix[n] = ursiData.prefix[n - 1] + (missing ? 0 : value);
+            ursiData.nan_prefix[n] = ursiData.nan_prefix[n - 1] + (missing ? 1 : 0);
+            if (ursiData.ma) ursiData.ma[n - 1] = maAt(n - 1);
+
+            if (sameDay || ursiData.lod) {
+                // In-place change, or a downsampled view: redraw from the local arrays
+                redrawLOD(divId, ursiData);
+            } else {
+                Plotly.extendTraces(divId, {x: [[point.date]], y: [[value]], customdata: [[customdata]]},
+                                    [ursiData.traces[0]]);
+                if (ursiData.ma) {
+                    Plotly.extendTraces(divId, {x: [[new Date(point.date)]], y: [[ursiData.ma[n - 1]]]},
+                                        [ursiData.traces[1]]);
+                }
+            }
+        }
+
+        const source = new EventSource('/events');
+        source.onmessage = event => applyPoint(JSON.parse(event.data));
+    })();
+</script>
+"""
+
+
+class Broadcaster:
+    """Fan-out of new URSI points to every connected browser.
+
+    The latest point per date is kept so late subscribers catch up with everything
+    pushed since the server started (and not yet in the page file).
+    """
+
+    def __init__(self):
+        self.clients = set()
+        self.latest = {}
+
+    def publish(self, point):
+        self.latest[point['date']] = point
+        for queue in self.clients:
+            queue.put_nowait(point)
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        for point in self.latest.values():
+            queue.put_nowait(point)
+        self.clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.clients.discard(queue)
+
+
+def to_point(row):
+    """JSON-safe point from a breadth row or snapshot (NaN URSI becomes null)."""
+    point = {'date': row['date'].strftime('%Y-%m-%d')}
+    for name in ['advancing_stocks', 'declining_stocks', 'unchanged_stocks', 'total_stocks']:
+        point[name] = int(row[name])
+    ursi = float(row['URSI'])
+    point['URSI'] = None if math.isnan(ursi) else ursi
+    return point
+
+
+def page_last_date(page_file):
+    """Last trading day embedded in a page written with the 'binary' data embedding."""
+    with open(page_file, encoding='utf-8') as f:
+        match = re.search(r'const ursiPayload = (\{.*?\});\n', f.read())
+    if match is None:
+        raise ValueError(f"{page_file} must be generated with the 'binary' data embedding")
+    days = np.frombuffer(base64.b64decode(json.loads(match.group(1))['days']), dtype='<i4')
+    return pd.Timestamp(days.max().astype('datetime64[D]')) if len(days) else None
+
+
+async def poll_daily(broadcaster, interval=POLL_INTERVAL, after=None):
+    """Publish trading days of the end-of-day data newer than `after`, then each day appended.
+
+    `after` is the last day the served page already has (see page_last_date());
+    days added between writing the page and starting the server are published
+    first, so the chart has no gap. By default only days added later are.
+    """
+    loop = asyncio.get_running_loop()
+    last_date = after
+    while True:
+        # load_breadth only recomputes when the source file changed
+        daily_stats = await loop.run_in_executor(None, load_breadth)
+        if last_date is None:
+            last_date = daily_stats['date'].max()
+        for _, row in daily_stats[daily_stats['date'] > last_date].iterrows():
+            broadcaster.publish(to_point(row))
+        last_date = max(last_date, daily_stats['date'].max())
+        await asyncio.sleep(interval)
+
+
+async def publish_ticks(broadcaster, ticks_file, session=None, interval=SNAPSHOT_INTERVAL, speed=None):
+    """Publish intraday snapshots from a replayed tick file."""
+    tracker = BreadthTracker(reference_closes(session))
+    async for snapshot in stream_ursi(replay_ticks(ticks_file, speed), tracker, interval):
+        broadcaster.publish(to_point(snapshot))
+
+
+async def _send(writer, status, content_type, body):
+    writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+
+
+def make_handler(page_file, broadcaster, api):
+    """HTTP handler serving the page, its local .js files, the /events stream and the /ursi API."""
+    page_dir = os.path.dirname(os.path.abspath(page_file))
+    with open(page_file, encoding='utf-8') as f:
+        page = f.read()
+    if 'decodeUrsiData(' not in page:
+        raise ValueError(f"{page_file} must be generated with the 'binary' data embedding")
+    live_js = LIVE_JS.replace('CUSTOMDATA_COLUMNS', json.dumps(CUSTOMDATA_COLUMNS))
+    page = page.replace('</body>', live_js + '</body>', 1).encode('utf-8')
+
+    async def handle(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            # Skip the request headers
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            url = urlsplit(request_line[1] if len(request_line) > 1 else '/')
+            path = url.path
+
+            if path == '/':
+                await _send(writer, '200 OK', 'text/html; charset=utf-8', page)
+            elif path == '/events':
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                             b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+                queue = broadcaster.subscribe()
+                try:
+                    while True:
+                        point = await queue.get()
+                        writer.write(f"data: {json.dumps(point)}\n\n".encode('utf-8'))
+                        await writer.drain()
+                finally:
+                    broadcaster.unsubscribe(queue)
+            elif path == '/ursi':
+                # /ursi?from=&to=&group=&ma=&tickers= ; cache misses are computed off the event loop
+                loop = asyncio.get_running_loop()
+                try:
+                    body = await loop.run_in_executor(None, api.query, parse_qs(url.query))
+                except QueryError as e:
+                    await _send(writer, '400 Bad Request', 'text/plain', str(e).encode('utf-8'))
+                except Exception:
+                    traceback.print_exc()
+                    await _send(writer, '500 Internal Server Error', 'text/plain', b'Query failed')
+                else:
+                    await _send(writer, '200 OK', 'application/json', body)
+            elif path.endswith('.js') and os.path.isfile(os.path.join(page_dir, os.path.basename(path))):
+                # Shared plotly.min.js written next to the page
+                with open(os.path.join(page_dir, os.path.basename(path)), 'rb') as f:
+                    await _send(writer, '200 OK', 'application/javascript', f.read())
+            else:
+                await _send(writer, '404 Not Found', 'text/plain', b'Not found')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(page_file=PAGE_FILE, host=HOST, port=PORT, ticks_file=None, session=None,
+                interval=SNAPSHOT_INTERVAL, speed=None, poll_interval=POLL_INTERVAL, groups_file=GROUPS_FILE):
+    """Serve the dashboard and query API and push new daily points (or replayed intraday snapshots)."""
+    broadcaster = Broadcaster()
+    api = UrsiQuery(groups_file=groups_file)
+    server = await asyncio.start_server(make_handler(page_file, broadcaster, api), host, port)
+    if ticks_file:
+        producer = publish_ticks(broadcaster, ticks_file, session, interval, speed)
+    else:
+        producer = poll_daily(broadcaster, poll_interval, after=page_last_date(page_file))
+    print(f"URSI dashboard running at http://{host}:{port}/")
+    print(f"Query API: http://{host}:{port}/ursi?from=&to=&group=&ma=&tickers=")
+    async with server:
+        await asyncio.gather(server.serve_forever(), producer)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the URSI dashboard with live updates and the /ursi query API')
+    parser.add_argument('--page', default=PAGE_FILE)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--ticks', help='replay this tick file as intraday snapshots instead of polling daily data')
+    parser.add_argument('--session', help='session date of the tick file')
+    parser.add_argument('--interval', type=float, default=SNAPSHOT_INTERVAL, help='seconds between snapshots')
+    parser.add_argument('--speed', type=float, help='tick replay speed (1 = real time)')
+    parser.add_argument('--poll', type=float, default=POLL_INTERVAL, help='seconds between daily data checks')
+    parser.add_argument('--groups', default=GROUPS_FILE, help='stock, group CSV for /ursi?group= queries')
+    args = parser.parse_args()
+    asyncio.run(serve(args.page, args.host, args.port, args.ticks, args.session,
+                      args.interval, args.speed, args.poll, args.groups))
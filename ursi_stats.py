@@ -0,0 +1,160 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+from ursi_core import CACHE_VERSION, DATA_DIR, read_cache, write_cache
+
+# Persisted accumulator for the generate_ursi_with_ma.py summary sheets
+STATS_CACHE_FILE = os.path.join(DATA_DIR, 'ursi_stats_cache.pkl')
+
+# URSI zone thresholds
+OVERBOUGHT = 70
+OVERSOLD = 30
+
+# Count columns averaged in the monthly/yearly rollups
+ROLLUP_COLUMNS = ['advancing_stocks', 'declining_stocks', 'unchanged_stocks']
+
+
+class UrsiStats:
+    """Summary statistics of a daily URSI series, folded in one pass per batch of days.
+
+    update() only touches the new rows: running count/mean/M2 (merged with Chan's
+    formula for the standard deviation), min/max, zone counts, a sorted copy of
+    the values for the median, and per-month/per-year sums for the rollups. NaN
+    values (days without advancing or declining stocks) count as trading days but
+    are left out of the URSI statistics, as pandas does.
+    """
+
+    def __init__(self, column='URSI', rollup_columns=ROLLUP_COLUMNS):
+        self.column = column
+        self.rollup_columns = list(rollup_columns)
+        self.days = 0
+        self.count = 0
+        self.mean = float('nan')
+        self.m2 = 0.0
+        self.min = float('nan')
+        self.max = float('nan')
+        self.above = 0
+        self.below = 0
+        self.neutral = 0
+        self.sorted_values = np.empty(0)
+        self.first_date = None
+        self.last_date = None
+        self.latest = None
+        self.months = None
+        self.years = None
+
+    def _rollup(self, totals, batch, periods):
+        """Add the batch's per-period sums to `totals`."""
+        sums = batch[self.rollup_columns].groupby(periods).sum()
+        sums['days'] = batch.groupby(periods).size()
+        sums['ursi_sum'] = batch[self.column].groupby(periods).sum()
+        sums['ursi_count'] = batch[self.column].groupby(periods).count()
+        return sums if totals is None else totals.add(sums, fill_value=0)
+
+    def update(self, daily_stats):
+        """Fold in the rows dated after the last folded day; returns self."""
+        batch = daily_stats
+        if self.last_date is not None:
+            batch = batch[batch['date'] > self.last_date]
+        if len(batch) == 0:
+            return self
+
+        values = batch[self.column].to_numpy(dtype=float)
+        valid = values[~np.isnan(values)]
+        if len(valid):
+            n, batch_mean = len(valid), valid.mean()
+            batch_m2 = ((valid - batch_mean) ** 2).sum()
+            if self.count == 0:
+                self.mean, self.m2 = batch_mean, batch_m2
+                self.min, self.max = valid.min(), valid.max()
+            else:
+                total = self.count + n
+                delta = batch_mean - self.mean
+                self.mean += delta * n / total
+                self.m2 += batch_m2 + delta ** 2 * self.count * n / total
+                self.min, self.max = min(self.min, valid.min()), max(self.max, valid.max())
+            self.count += n
+            self.above += int((valid > OVERBOUGHT).sum())
+            self.below += int((valid < OVERSOLD).sum())
+            self.neutral += int(((valid >= OVERSOLD) & (valid <= OVERBOUGHT)).sum())
+            valid = np.sort(valid)
+            self.sorted_values = np.insert(self.sorted_values,
+                                           np.searchsorted(self.sorted_values, valid), valid)
+
+        dates = batch['date']
+        self.months = self._rollup(self.months, batch, dates.dt.to_period('M').rename(None))
+        self.years = self._rollup(self.years, batch, dates.dt.year.rename(None))
+
+        self.days += len(batch)
+        if self.first_date is None:
+            self.first_date = dates.iloc[0]
+        self.last_date = dates.iloc[-1]
+        self.latest = batch.iloc[-1].to_dict()
+        return self
+
+    @property
+    def median(self):
+        return float(np.median(self.sorted_values)) if self.count else float('nan')
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1), as pandas computes it."""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float('nan')
+
+    def _averages(self, totals, label):
+        averages = pd.DataFrame({'Avg_URSI': totals['ursi_sum'] / totals['ursi_count']})
+        for name in self.rollup_columns:
+            short = name.split('_')[0].capitalize()
+            averages[f'Avg_{short}'] = totals[name] / totals['days']
+        averages = averages.round(2)
+        averages.insert(0, label, totals.index)
+        return averages.reset_index(drop=True)
+
+    def monthly(self):
+        """Monthly averages of URSI and the rollup counts (Month as the month start)."""
+        averages = self._averages(self.months, 'Month')
+        averages['Month'] = averages['Month'].dt.to_timestamp()
+        return averages
+
+    def yearly(self):
+        """Yearly averages of URSI and the rollup counts."""
+        averages = self._averages(self.years, 'Year')
+        averages['Year'] = averages['Year'].astype(int)
+        return averages
+
+
+def _folded_hash(daily_stats, stats):
+    """Fingerprint of the rows of `daily_stats` folded into `stats` (its first stats.days rows)."""
+    columns = ['date', stats.column] + stats.rollup_columns
+    hashes = pd.util.hash_pandas_object(daily_stats[columns].iloc[:stats.days], index=False)
+    return hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
+
+
+def load_stats(daily_stats, cache_file=STATS_CACHE_FILE):
+    """UrsiStats of `daily_stats`, folding only the days added since the cached accumulator.
+
+    The cache is rebuilt when `daily_stats` no longer starts with exactly the
+    rows it was built from (e.g. a restated close changed history, or days were
+    back-filled).
+    """
+    stats = None
+    cached = read_cache(cache_file)
+    if isinstance(cached, dict) and cached.get('version') == CACHE_VERSION:
+        stats = cached.get('stats')
+
+    if stats is not None:
+        # Same days up to the last folded one, with the same values
+        folded = int(daily_stats['date'].searchsorted(stats.last_date, side='right'))
+        if folded != stats.days or _folded_hash(daily_stats, stats) != cached.get('folded'):
+            stats = None
+
+    if stats is None:
+        stats = UrsiStats()
+    if stats.last_date is None or daily_stats['date'].iloc[-1] > stats.last_date:
+        stats.update(daily_stats)
+        if cache_file:
+            write_cache({'version': CACHE_VERSION, 'stats': stats,
+                         'folded': _folded_hash(daily_stats, stats)}, cache_file)
+    return stats
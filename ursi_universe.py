@@ -0,0 +1,252 @@
+import os
+import numpy as np
+import pandas as pd
+
+from ursi_core import (BREADTH_COLUMNS, CACHE_VERSION, DATA_DIR, _add_ursi, _classify_changes,
+                       _classify_numpy, default_source, load_close_matrix, read_arrays, source_signature,
+                       write_arrays)
+
+# Listing table: one row per listing spell with stock, listed and delisted dates
+# (delisted empty while still listed; a relisted stock gets a second row)
+LISTINGS_FILE = os.path.join(DATA_DIR, 'ursi_listings.csv')
+
+# Saved point-in-time membership bitmaps
+UNIVERSE_FILE = os.path.join(DATA_DIR, 'ursi_universe.npz')
+
+# Persisted bit-packed state matrix (see load_states)
+STATES_FILE = os.path.join(DATA_DIR, 'ursi_states.npz')
+
+# Set bits per byte value, for numpy versions without np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount_rows(bits):
+    """Number of set bits in each row of a packed uint8 bitmap."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int64)
+    return _BYTE_POPCOUNT[bits].sum(axis=1, dtype=np.int64)
+
+
+def load_listings(path=LISTINGS_FILE):
+    """Listing table with `listed`/`delisted` parsed as dates (NaT while listed)."""
+    listings = pd.read_csv(path, dtype={'stock': str})
+    listings['listed'] = pd.to_datetime(listings['listed'])
+    listings['delisted'] = pd.to_datetime(listings['delisted'])
+    return listings
+
+
+def listings_from_ohlcv(df):
+    """Listing table implied by the price rows: first to last trading day of each stock.
+
+    A stock still trading on the last date in `df` is treated as listed.
+    """
+    spans = df.groupby('stock', observed=True)['date'].agg(['min', 'max'])
+    delisted = spans['max'].where(spans['max'] < df['date'].max())
+    # Delisted the session after the last trade; NaT keeps it listed
+    return pd.DataFrame({
+        'stock': spans.index.astype(str),
+        'listed': spans['min'].to_numpy(),
+        'delisted': (delisted + pd.Timedelta(days=1)).to_numpy(),
+    })
+
+
+class UniverseIndex:
+    """Point-in-time universe: one packed membership bitmap row per date.
+
+    Bit j of row i is set when stocks[j] was listed on dates[i], i.e. listed
+    <= date < delisted for one of its listing spells.
+    """
+
+    def __init__(self, bits, dates, stocks):
+        self.bits = bits
+        self.dates = pd.DatetimeIndex(dates)
+        self.stocks = pd.Index(stocks)
+
+    @classmethod
+    def from_listings(cls, listings, dates, stocks):
+        """Membership of `stocks` on `dates` from a listing table (see load_listings())."""
+        dates = pd.DatetimeIndex(dates)
+        stocks = pd.Index(stocks).astype(str)
+        listings = listings[listings['stock'].isin(stocks)]
+        columns = stocks.get_indexer(listings['stock'])
+        start = dates.searchsorted(listings['listed'])
+        # Still-listed spells run past the last date
+        delisted = listings['delisted']
+        end = np.full(len(listings), len(dates))
+        end[delisted.notna().to_numpy()] = dates.searchsorted(delisted.dropna())
+
+        # +1 where a spell starts and -1 where it ends, summed down the dates
+        spells = np.zeros((len(dates) + 1, len(stocks)), dtype=np.int32)
+        np.add.at(spells, (start, columns), 1)
+        np.add.at(spells, (end, columns), -1)
+        member = np.cumsum(spells[:-1], axis=0) > 0
+        return cls(np.packbits(member, axis=1), dates, stocks)
+
+    def mask(self, date):
+        """Boolean membership of every stock on `date` (as of the latest date <= `date`)."""
+        row = self.dates.searchsorted(pd.Timestamp(date), side='right') - 1
+        if row < 0:
+            return np.zeros(len(self.stocks), dtype=bool)
+        return np.unpackbits(self.bits[row], count=len(self.stocks)).astype(bool)
+
+    def members(self, date):
+        """Stocks in the universe on `date`."""
+        return list(self.stocks[self.mask(date)])
+
+    def counts(self):
+        """Universe size per date."""
+        return pd.Series(popcount_rows(self.bits), index=self.dates, name='universe_stocks')
+
+    def reindex(self, dates, stocks):
+        """The same universe on other (dates, stocks) axes, membership taken as of each date."""
+        member = np.unpackbits(self.bits, axis=1, count=len(self.stocks)).astype(bool)
+        rows = self.dates.searchsorted(pd.DatetimeIndex(dates), side='right') - 1
+        columns = self.stocks.get_indexer(pd.Index(stocks).astype(str))
+        out = member[np.maximum(rows, 0)][:, np.maximum(columns, 0)]
+        out[rows < 0] = False
+        out[:, columns < 0] = False
+        return UniverseIndex(np.packbits(out, axis=1), dates, stocks)
+
+    def save(self, path=UNIVERSE_FILE):
+        write_arrays(path, compressed=True, bits=self.bits, stocks=np.asarray(self.stocks, dtype=str),
+                     days=self.dates.to_numpy().astype('datetime64[D]').astype(np.int64))
+
+    @classmethod
+    def load(cls, path=UNIVERSE_FILE):
+        with np.load(path) as saved:
+            return cls(saved['bits'], saved['days'].astype('datetime64[D]'), saved['stocks'])
+
+
+class BreadthStates:
+    """Each stock's daily close-change state, packed as one bitmap per state.
+
+    Built once from the price rows; breadth for any universe is then an AND with
+    its membership bitmap and a popcount per date, with no pass over the long
+    frame and no re-classification.
+    """
+
+    STATES = ('advancing', 'declining', 'unchanged', 'valid')
+
+    def __init__(self, planes, dates, stocks):
+        self.planes = planes
+        self.dates = pd.DatetimeIndex(dates)
+        self.stocks = pd.Index(stocks)
+
+    @classmethod
+    def from_changes(cls, change, valid, dates, stocks):
+        """Pack classified close changes (see ursi_core._classify_changes) as state bitmaps."""
+        planes = {
+            'advancing': np.packbits(change > 0, axis=1),
+            'declining': np.packbits(change < 0, axis=1),
+            'unchanged': np.packbits((change == 0) & valid, axis=1),
+            'valid': np.packbits(valid, axis=1),
+        }
+        return cls(planes, dates, pd.Index(stocks).astype(str))
+
+    @classmethod
+    def from_frame(cls, df, last_close=None):
+        """Classify `df` (stock, date, close rows) with the dense engine and pack the states."""
+        return cls.from_changes(*_classify_numpy(df, last_close))
+
+    @classmethod
+    def from_matrix(cls, closes, prev_close, present, dates, stocks):
+        """Pack the states of a close matrix as returned by load_close_matrix()."""
+        return cls.from_changes(*_classify_changes(closes, prev_close, present), dates, stocks)
+
+    def basket_mask(self, tickers):
+        """Packed bitmap row selecting `tickers`; tickers without price data are ignored."""
+        return np.packbits(self.stocks.isin([str(t) for t in tickers]))
+
+    def basket_breadth(self, tickers):
+        """Daily breadth of an ad-hoc basket of tickers."""
+        return self.breadth(self.basket_mask(tickers))
+
+    def save(self, path=STATES_FILE, source=None):
+        """Write the packed planes (uncompressed, for fast loads) with an optional source key."""
+        write_arrays(path, stocks=np.asarray(self.stocks, dtype=str),
+                     days=self.dates.to_numpy().astype('datetime64[D]').astype(np.int64),
+                     source=np.asarray(repr(source)), **self.planes)
+
+    @classmethod
+    def load(cls, path=STATES_FILE):
+        """Saved states and the source key they were saved with, or (None, None) if unreadable."""
+        saved = read_arrays(path, cls.STATES + ('days', 'stocks', 'source'))
+        if saved is None:
+            return None, None
+        planes = {name: saved[name] for name in cls.STATES}
+        return cls(planes, saved['days'].astype('datetime64[D]'), saved['stocks']), str(saved['source'])
+
+    def breadth(self, mask=None):
+        """Daily breadth (BREADTH_COLUMNS) over the stocks selected by `mask`.
+
+        `mask` is a UniverseIndex (membership as of each date), a packed bitmap row
+        applied to every date, or None for every stock.
+        """
+        if isinstance(mask, UniverseIndex):
+            if not (mask.dates.equals(self.dates) and mask.stocks.equals(self.stocks)):
+                mask = mask.reindex(self.dates, self.stocks)
+            mask = mask.bits
+        planes = self.planes if mask is None else {k: v & mask for k, v in self.planes.items()}
+
+        keep = popcount_rows(planes['valid']) > 0
+        stats = pd.DataFrame({
+            'date': self.dates[keep],
+            'advancing_stocks': popcount_rows(planes['advancing'])[keep],
+            'declining_stocks': popcount_rows(planes['declining'])[keep],
+            'unchanged_stocks': popcount_rows(planes['unchanged'])[keep],
+        })
+        return _add_ursi(stats)[BREADTH_COLUMNS]
+
+
+# In-process cache of load_states(), keyed like its file
+_states_memo = {}
+
+
+def load_states(path=None, states_file=STATES_FILE):
+    """BreadthStates of the whole history of `path`, classified at most once per source version.
+
+    `path` defaults to default_source(). The packed matrix is memoised in-process
+    and saved to `states_file`, so basket queries never touch the OHLCV data
+    until it changes.
+    """
+    if path is None:
+        path = default_source()
+    key = (CACHE_VERSION, os.path.abspath(path), source_signature(path))
+    if key in _states_memo:
+        return _states_memo[key]
+
+    states = None
+    if states_file:
+        # A missing, truncated or stale file is rebuilt
+        states, source = BreadthStates.load(states_file)
+        if source != repr(key):
+            states = None
+
+    if states is None:
+        states = BreadthStates.from_matrix(*load_close_matrix(path))
+        if states_file:
+            states.save(states_file, source=key)
+
+    _states_memo.clear()
+    _states_memo[key] = states
+    return states
+
+
+def basket_breadth(tickers, path=None):
+    """Daily breadth (BREADTH_COLUMNS) of any list of tickers, from the persisted state matrix."""
+    return load_states(path).basket_breadth(tickers)
+
+
+def compute_universe_breadth(df, universe, last_close=None):
+    """Breadth of `df` counted only over the as-of members of `universe` on each date.
+
+    Adds a `universe_stocks` column with the universe size. To evaluate several
+    universes, build BreadthStates.from_frame(df) once and call breadth() per
+    universe instead.
+    """
+    states = BreadthStates.from_frame(df, last_close)
+    if not (universe.dates.equals(states.dates) and universe.stocks.equals(states.stocks)):
+        universe = universe.reindex(states.dates, states.stocks)
+    stats = states.breadth(universe)
+    stats['universe_stocks'] = universe.counts().reindex(stats['date']).to_numpy()
+    return stats